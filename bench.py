@@ -0,0 +1,633 @@
+"""Local benchmarks for Darhisper's processing pipeline.
+
+Run from the project venv, e.g.:
+
+    ./venv/bin/python bench.py resilience --jobs 20
+
+Benchmarks never touch the real Gemini API: network calls go to
+FakeGeminiClient, a local stand-in with configurable latency and faults.
+"""
+import argparse
+import logging
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+import main
+
+
+# --- Local Gemini stand-in ---
+class FakeAPIError(Exception):
+    """Mimics google.genai.errors.APIError closely enough for retry logic."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeFile:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiClient:
+    """Fault-injecting replacement for genai.Client.
+
+    Latency is lognormal around ``latency`` seconds; a fraction of calls
+    become stragglers (``straggler_factor`` times slower) and a fraction
+    fail with a retryable 503. With ``uplink_mbps`` set, uploads sleep for
+    the time the file would take on that link. With ``quota_rpm`` set, calls
+    beyond that many per ``quota_window`` seconds fail with a 429.
+    """
+
+    def __init__(self, latency=1.0, straggler_rate=0.05, straggler_factor=10.0,
+                 error_rate=0.05, uplink_mbps=None, quota_rpm=None, quota_window=60.0, seed=0):
+        self.latency = latency
+        self.quota_rpm = quota_rpm
+        self.quota_window = quota_window
+        self.recent = []
+        self.uplink_mbps = uplink_mbps
+        self.straggler_rate = straggler_rate
+        self.straggler_factor = straggler_factor
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.files = self
+        self.models = self
+
+    def _roll(self):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency * self.rng.lognormvariate(0, 0.25)
+            if self.rng.random() < self.straggler_rate:
+                delay *= self.straggler_factor
+            fail = self.rng.random() < self.error_rate
+        return delay, fail
+
+    def upload(self, file):
+        if self.uplink_mbps:
+            time.sleep(os.path.getsize(file) * 8 / (self.uplink_mbps * 1e6))
+        return FakeFile(os.path.basename(file))
+
+    def delete(self, name):
+        pass
+
+    def _over_quota(self):
+        if not self.quota_rpm:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if now - t < self.quota_window]
+            if len(self.recent) >= self.quota_rpm:
+                return True
+            self.recent.append(now)
+            return False
+
+    def generate_content(self, model, contents):
+        if self._over_quota():
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+        inline = getattr(contents[0], "inline_data", None)
+        if inline is not None and self.uplink_mbps:
+            time.sleep(len(inline.data) * 8 / (self.uplink_mbps * 1e6))
+        delay, fail = self._roll()
+        time.sleep(delay)
+        if fail:
+            raise FakeAPIError(503, "UNAVAILABLE")
+        return FakeResponse("texto de prueba")
+
+
+def percentiles(samples, unit="s"):
+    scale = 1000 if unit == "ms" else 1
+    samples = sorted(x * scale for x in samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return (f"p50={pick(0.5):.2f}{unit} p95={pick(0.95):.2f}{unit} "
+            f"p99={pick(0.99):.2f}{unit} max={samples[-1]:.2f}{unit}")
+
+
+def make_wav(seconds):
+    path = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+    wav.write(path, main.SAMPLE_RATE, np.zeros(int(seconds * main.SAMPLE_RATE), dtype=np.int16))
+    return path
+
+
+# --- Benchmarks ---
+def bench_resilience(args):
+    """File-job wall time with and without hedging against the stand-in."""
+    wav_path = make_wav(args.chunks * args.chunk_duration)
+    try:
+        for hedge in (False, True):
+            main.METRICS = main.Metrics()
+            worker = main.TranscriptionWorker()
+            worker.gemini_client = FakeGeminiClient(
+                latency=args.latency, straggler_rate=args.straggler_rate,
+                error_rate=args.error_rate, seed=args.seed
+            )
+            worker.chunk_caller = main.ResilientCaller(base_delay=0.05, hedge=hedge, hedge_min_delay=0)
+            worker.rate_limiter = main.RateLimiter(0, 0)
+            job_times = []
+            for _ in range(args.jobs):
+                start = time.monotonic()
+                worker.transcribe_with_gemini_chunks(
+                    wav_path, "", "Transcripción Literal", "fake", chunk_duration=args.chunk_duration
+                )
+                job_times.append(time.monotonic() - start)
+            chunk = main.METRICS.summary("gemini.chunk.total")
+            print(f"hedge={'on ' if hedge else 'off'} jobs: {percentiles(job_times)}")
+            print(f"          chunk p95={chunk['p95']:.2f}s, "
+                  f"requests={worker.gemini_client.calls}, "
+                  f"hedged={main.METRICS.counters.get('gemini.chunk.hedged', 0)}, "
+                  f"retries={main.METRICS.counters.get('gemini.chunk.retries', 0)}")
+    finally:
+        os.remove(wav_path)
+
+
+def bench_codecs(args):
+    """Bytes on the wire and file-job time per upload codec."""
+    if args.input:
+        wav_path = main.TranscriptionWorker().convert_audio_to_wav(args.input)
+    else:
+        # Speech-like noise compresses less than silence; keep the estimate honest
+        samples = (np.random.randn(int(args.seconds * main.SAMPLE_RATE)) * 3000).astype(np.int16)
+        wav_path = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+        wav.write(wav_path, main.SAMPLE_RATE, samples)
+    try:
+        for codec in main.UPLOAD_CODECS:
+            main.METRICS = main.Metrics()
+            worker = main.TranscriptionWorker()
+            worker.upload_codec = codec
+            worker.rate_limiter = main.RateLimiter(0, 0)
+            worker.gemini_client = FakeGeminiClient(
+                latency=args.latency, straggler_rate=0, error_rate=0, uplink_mbps=args.uplink_mbps
+            )
+            start = time.monotonic()
+            worker.transcribe_with_gemini_chunks(
+                wav_path, "", "Transcripción Literal", "fake", chunk_duration=args.chunk_duration
+            )
+            wall = time.monotonic() - start
+            sent = main.METRICS.counters.get(f"upload.bytes.{codec}", 0)
+            encode = main.METRICS.summary(f"encode.{codec}")
+            encode_ms = f"{encode['mean'] * 1000:.0f} ms/chunk" if encode else "n/a"
+            print(f"{codec:5s} bytes={sent / 1e6:8.2f} MB  end-to-end={wall:6.2f}s  encode={encode_ms}")
+    finally:
+        os.remove(wav_path)
+
+
+def bench_decode(args):
+    """Decode wall time of a long media file for several worker counts."""
+    path = args.input
+    if path is None:
+        # Synthetic mp3 of the requested length
+        path = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
+        subprocess.run(
+            [main.find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+             '-i', f"sine=frequency=440:duration={args.hours * 3600:.0f}", '-ac', '1',
+             '-c:a', 'libmp3lame', '-b:a', '64k', '-y', path],
+            check=True
+        )
+    try:
+        duration = main.probe_duration(path)
+        print(f"{os.path.basename(path)}: {duration / 3600:.2f} h")
+
+        start = time.monotonic()
+        os.remove(main.TranscriptionWorker().convert_audio_to_wav(path))
+        print(f"single ffmpeg (convert_audio_to_wav): {time.monotonic() - start:6.1f}s")
+
+        chunk = int(args.chunk_duration * main.SAMPLE_RATE)
+        for workers in args.workers:
+            source = main.FfmpegRangeSource(path, duration, workers)
+            ranges = [(i, min(i + chunk, source.total_samples)) for i in range(0, source.total_samples, chunk)]
+            start = time.monotonic()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                decoded = sum(len(a) for a in pool.map(lambda r: source.read(*r), ranges))
+            print(f"{workers:2d} workers, {len(ranges)} segments: {time.monotonic() - start:6.1f}s "
+                  f"({decoded / main.SAMPLE_RATE / 3600:.2f} h decoded)")
+    finally:
+        if args.input is None:
+            os.remove(path)
+
+
+LOCAL_PROMPT_FIXTURES = [
+    ("Transcripción Literal", "eh, bueno, quería decir que que mañana vamos al cine a las ocho ."),
+    ("Transcripción Literal", "este, no sé si te llegó el correo. mm vale, te lo reenvío ahora"),
+    ("Transcripción Literal", "o sea, el informe está casi listo, falta revisar las cifras del trimestre"),
+    ("Transcripción Literal", "¿me puedes llamar cuando salgas? eh gracias"),
+    ("Lista de Tareas (To-Do)", "comprar pan y luego llamar a Juan, también revisar el correo."),
+    ("Lista de Tareas (To-Do)", "eh, preparar la presentación. enviar la factura a Marta; después reservar la sala"),
+]
+
+
+def bench_ratelimit(args):
+    """Live dictations during a file job against a stand-in that returns 429s."""
+    wav_path = make_wav(args.chunks * args.chunk_duration)
+    text = "eh, bueno, quería decir que mañana vamos al cine"
+    try:
+        for limited in (False, True):
+            main.METRICS = main.Metrics()
+            fake = FakeGeminiClient(latency=args.latency, straggler_rate=0, error_rate=0,
+                                    quota_rpm=args.quota_rpm, quota_window=args.window)
+            main.genai.Client = lambda api_key: fake
+            worker = main.TranscriptionWorker()
+            worker.gemini_client = fake
+            worker.smart_cache = main.SmartPromptCache(path=os.path.join(tempfile.mkdtemp(), "cache.json"))
+            worker.chunk_caller = main.ResilientCaller(base_delay=0.05, max_delay=args.window, max_workers=16)
+            worker.chunk_planner.parallelism = args.parallelism
+            worker.rate_limiter = main.RateLimiter(
+                rpm=args.quota_rpm if limited else 0, tpm=0, reserve=args.reserve, period=args.window
+            )
+
+            start = time.monotonic()
+            job = threading.Thread(target=worker.transcribe_with_gemini_chunks, args=(
+                wav_path, "", "Transcripción Literal", "fake"), kwargs={"chunk_duration": args.chunk_duration})
+            job.start()
+            live, fallbacks = [], 0
+            while job.is_alive():
+                t = time.monotonic()
+                # Distinct text per call so the Smart Prompt cache never answers
+                sample = f"{text} {len(live)}"
+                fallbacks += worker.process_with_gemini(sample, "fake-key", "Transcripción Literal") == sample
+                live.append(time.monotonic() - t)
+                time.sleep(args.live_interval)
+            wall = time.monotonic() - start
+            counters = main.METRICS.counters
+            print(f"limiter={'on ' if limited else 'off'} file job {wall:5.1f}s, "
+                  f"server 429s={counters.get('ratelimit.server_429', 0)}, "
+                  f"chunk retries={counters.get('gemini.chunk.retries', 0)}")
+            print(f"             live: {len(live)} calls, {fallbacks} fell back to raw text, {percentiles(live)}")
+            print(f"             throttled: chunk {counters.get('ratelimit.wait_seconds.chunk', 0):.1f}s, "
+                  f"live {counters.get('ratelimit.wait_seconds.live', 0):.2f}s, "
+                  f"live retries after 429 {counters.get('ratelimit.live_retries', 0)}")
+    finally:
+        os.remove(wav_path)
+
+
+def bench_cancel(args):
+    """Time from cancel to job exit and to all resources released."""
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "input.mp3")
+    subprocess.run(
+        [main.find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+         '-i', f"sine=frequency=440:duration={args.minutes * 60:.0f}", '-ac', '1',
+         '-c:a', 'libmp3lame', '-b:a', '64k', '-y', path],
+        check=True
+    )
+    main.JOBS_DIR = os.path.join(tmp, "jobs")
+    tempfile.tempdir = os.path.join(tmp, "scratch")
+    os.makedirs(tempfile.tempdir)
+
+    # decode_workers=1 converts the whole file first (cancel kills that
+    # ffmpeg); otherwise the cancel lands while chunk requests are in flight
+    for stage, decode_workers in (("convert", 1), ("chunks", 4)):
+        main.METRICS = main.Metrics()
+        worker = main.TranscriptionWorker()
+        worker.decode_workers = decode_workers
+        worker.gemini_client = FakeGeminiClient(latency=args.latency, straggler_rate=0, error_rate=0)
+        worker.chunk_planner = main.ChunkPlanner(min_chunk=60, max_chunk=60)
+        cancelled = threading.Event()
+        worker.file_cancelled.connect(cancelled.set)
+        job = threading.Thread(
+            target=worker.transcribe_file, args=(path, "fake-key", "Transcripción Literal", "fake")
+        )
+        job.start()
+        time.sleep(args.after)
+        start = time.monotonic()
+        worker.cancel_file_job()
+        job.join()
+        idle = time.monotonic() - start
+        while main.METRICS.summary("file_job.cancel_to_freed") is None and stage == "chunks":
+            time.sleep(0.01)
+        freed = time.monotonic() - start
+        leftovers = os.listdir(tempfile.tempdir) + (os.listdir(main.JOBS_DIR) if os.path.isdir(main.JOBS_DIR) else [])
+        print(f"{stage:8s} cancelled={cancelled.is_set()} job exit {idle * 1000:7.1f} ms, "
+              f"resources freed {freed * 1000:7.1f} ms, leftover files: {len(leftovers)}")
+    tempfile.tempdir = None
+
+
+def bench_local_prompts(args):
+    """Latency and output of the local fast path vs Gemini on fixtures."""
+    worker = None
+    if args.api_key:
+        worker = main.TranscriptionWorker()
+        worker.smart_cache = main.SmartPromptCache(path=os.path.join(tempfile.mkdtemp(), "cache.json"))
+    for prompt_key, text in LOCAL_PROMPT_FIXTURES:
+        processor = main.LOCAL_PROMPT_PROCESSORS[prompt_key]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            local = processor(text)
+        local_us = (time.perf_counter() - start) / args.repeat * 1e6
+        print(f"[{prompt_key}] {text}")
+        print(f"  local  ({local_us:8.1f} us): {local!r}")
+        if worker is not None:
+            start = time.perf_counter()
+            remote = worker.process_with_gemini(text, args.api_key, prompt_key)
+            print(f"  gemini ({(time.perf_counter() - start) * 1e6:8.0f} us): {remote!r}")
+
+
+def bench_history(args):
+    """History search latency on a store with many entries."""
+    words = ("hola mañana reunión informe correo factura cliente proyecto revisar enviar "
+             "llamar presupuesto equipo semana viernes lunes datos ventas").split()
+    rng = random.Random(0)
+    store = main.HistoryStore(path=os.path.join(tempfile.mkdtemp(), "history.sqlite3"))
+    start = time.monotonic()
+    for i in range(args.entries):
+        text = " ".join(rng.choices(words, k=25))
+        store.add("dictation", "Transcripción Literal", "bench", 3.0, {"asr": 0.2}, text)
+    while not store._queue.empty():
+        time.sleep(0.05)
+    time.sleep(store.batch_window * 2)
+    print(f"{args.entries} entries written in {time.monotonic() - start:.1f}s")
+    for query in ["", "factura", "reun", "cliente viernes", "factura cliente viernes ventas", "inexistente"]:
+        samples = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            rows = store.search(query)
+            samples.append(time.perf_counter() - t)
+        print(f"{query!r:34s} {len(rows):4d} rows  {percentiles(samples, unit='ms')}")
+
+
+def bench_profiler(args):
+    """Overhead of each profiling mode on a CPU-bound stand-in job."""
+    def job():
+        for prompt_key, text in LOCAL_PROMPT_FIXTURES * args.repeat:
+            main.LOCAL_PROMPT_PROCESSORS[prompt_key](text)
+
+    main.PROFILER.directory = tempfile.mkdtemp()
+    for mode in main.PROFILE_MODES:
+        main.PROFILER.mode = mode
+        samples = []
+        for _ in range(args.jobs):
+            start = time.perf_counter()
+            with main.PROFILER.job("bench"):
+                job()
+            samples.append(time.perf_counter() - start)
+        print(f"{mode:8s} {percentiles(samples, unit='ms')}")
+    print(f"profiles in {main.PROFILER.directory}")
+
+
+def bench_render(args):
+    """GUI-thread stall when showing a large file transcript."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QTextEdit, QPlainTextEdit
+    from PyQt6.QtGui import QTextCursor
+
+    app = QApplication.instance() or QApplication([])
+    rng = random.Random(0)
+    words = "la reunión empieza con el informe de ventas del trimestre y los datos del equipo".split()
+    chunks = []
+    while sum(map(len, chunks)) < args.chars:
+        paragraphs = [" ".join(rng.choices(words, k=100)) for _ in range(6)]
+        chunks.append("\n".join(paragraphs))
+    text = " ".join(chunks)[:args.chars]
+
+    def shown(cls):
+        widget = cls()
+        widget.resize(680, 400)
+        widget.show()
+        app.processEvents()
+        return widget
+
+    def timed(fn):
+        start = time.perf_counter()
+        fn()
+        app.processEvents()
+        return time.perf_counter() - start
+
+    print(f"{len(text)} chars in {len(chunks)} chunks")
+    for cls in (QTextEdit, QPlainTextEdit):
+        widget = shown(cls)
+        stall = timed(lambda: widget.setPlainText(text))
+        print(f"{cls.__name__:15s} whole text at the end:   stall {stall * 1000:8.1f} ms")
+        widget.close()
+
+    widget = shown(QPlainTextEdit)
+    stalls = []
+    for i in range(0, len(text), main.RENDER_BATCH_CHARS):
+        batch = text[i:i + main.RENDER_BATCH_CHARS]
+
+        def append():
+            cursor = QTextCursor(widget.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(batch)
+        stalls.append(timed(append))
+    print(f"QPlainTextEdit  {main.RENDER_BATCH_CHARS}-char appends:  {len(stalls)} turns, "
+          f"{percentiles(stalls, unit='ms')}")
+    widget.close()
+
+
+def bench_logging(args):
+    """Caller-side logging cost per dictation, split by what changed.
+
+    Level and lazy args are compared on the same synchronous handler. The
+    queue is compared with a fast file and with a file whose writes stall
+    for ``--stall-ms``, as on a busy disk.
+    """
+    text = "palabra " * args.words
+    root = logging.getLogger()
+    log_dir = tempfile.mkdtemp()
+
+    def legacy_dictation():
+        logging.info("Starting Recording")
+        logging.info("Stopping Recording")
+        logging.info("Starting transcription...")
+        logging.info(f"Raw transcription: {text}")
+        logging.info(f"Pasting: {text}")
+
+    def current_dictation():
+        logging.info("Starting Recording")
+        logging.info("Stopping Recording")
+        logging.info("Starting transcription...")
+        logging.debug("Raw transcription: %s", text)
+        logging.debug("Pasting: %s", text)
+
+    def stalling(handler):
+        emit = handler.emit
+
+        def slow_emit(record):
+            time.sleep(args.stall_ms / 1000)
+            emit(record)
+        handler.emit = slow_emit
+        return handler
+
+    def run(fn, dictations):
+        samples = []
+        for _ in range(dictations):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return percentiles(samples, unit="ms")
+
+    def sync(fn, level, stall=False, dictations=args.dictations):
+        handler = logging.FileHandler(os.path.join(log_dir, "sync.log"))
+        root.handlers[:] = [stalling(handler) if stall else handler]
+        root.setLevel(level)
+        result = run(fn, dictations)
+        handler.close()
+        return result
+
+    def queued(fn, stall=False, dictations=args.dictations):
+        main.LOG_FILE = os.path.join(log_dir, "queued.log")
+        listener = main.setup_logging("INFO")
+        if stall:
+            stalling(listener.handlers[0])
+        result = run(fn, dictations)
+        main.stop_logging()
+        return result
+
+    stalled = max(1, args.dictations // 20)
+    print(f"sync,  DEBUG, f-strings (legacy): {sync(legacy_dictation, logging.DEBUG)}")
+    print(f"sync,  INFO,  lazy args:          {sync(current_dictation, logging.INFO)}")
+    print(f"queue, INFO,  lazy args (now):    {queued(current_dictation)}")
+    print(f"with {args.stall_ms:g} ms disk stalls per write ({stalled} dictations):")
+    print(f"sync,  INFO,  lazy args:          {sync(current_dictation, logging.INFO, True, stalled)}")
+    print(f"queue, INFO,  lazy args (now):    {queued(current_dictation, True, stalled)}")
+
+
+def bench_capture(args):
+    """Peak RSS while capturing a long synthetic recording and segmenting it."""
+    block = (np.random.randn(1600, 1) * 0.1).astype(np.float32)
+    buffer = main.CaptureBuffer(main.SPILL_THRESHOLD_SECONDS * main.SAMPLE_RATE)
+    rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    before = rss()
+    for _ in range(int(args.minutes * 60 * main.SAMPLE_RATE / len(block))):
+        buffer.append(main.AudioRecorder._to_int16(block))
+    captured = buffer.finish()
+    after_capture = rss()
+    paths = main.write_asr_segments(captured)
+    after_segments = rss()
+    for path in paths + ([captured] if isinstance(captured, str) else []):
+        os.remove(path)
+    audio_mb = args.minutes * 60 * main.SAMPLE_RATE * 2 / 1e6
+    print(f"{args.minutes} min recording ({audio_mb:.0f} MB int16), {len(paths)} ASR segments")
+    print(f"peak RSS: start {before:.0f} MB, after capture {after_capture:.0f} MB, "
+          f"after segmenting {after_segments:.0f} MB")
+
+
+def bench_resample(args):
+    """CPU cost and stop latency of native-rate capture resampling."""
+    from scipy.signal import resample_poly
+
+    rng = np.random.default_rng(0)
+    for rate in args.rates:
+        audio = (rng.standard_normal(int(args.seconds * rate)) * 0.1).astype(np.float32)
+        resampler = main.StreamingResampler(rate)
+        out = []
+        start = time.perf_counter()
+        for i in range(0, len(audio), args.block):
+            out.append(resampler.process(audio[i:i + args.block]))
+        streaming = time.perf_counter() - start
+        start = time.perf_counter()
+        out.append(resampler.flush())
+        flush = time.perf_counter() - start
+        error = np.max(np.abs(np.concatenate(out) - resample_poly(audio, resampler.up, resampler.down)))
+        lag = (resampler.block + 2 * resampler.context) / rate
+        print(f"{rate:6d} Hz: {streaming / args.seconds * 1000:5.2f} ms CPU per audio second, "
+              f"flush at stop {flush * 1000:5.2f} ms, buffered <= {lag * 1000:5.1f} ms, "
+              f"max diff vs resample_poly {error:.1e}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("resilience", help="retry/hedging tail latency for file jobs")
+    p.add_argument("--jobs", type=int, default=20)
+    p.add_argument("--chunks", type=int, default=8)
+    p.add_argument("--chunk-duration", type=int, default=2)
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--straggler-rate", type=float, default=0.05)
+    p.add_argument("--error-rate", type=float, default=0.05)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_resilience)
+
+    p = sub.add_parser("codecs", help="upload size and time per codec")
+    p.add_argument("--input", help="audio file to use instead of synthetic audio")
+    p.add_argument("--seconds", type=float, default=600)
+    p.add_argument("--chunk-duration", type=int, default=300)
+    p.add_argument("--uplink-mbps", type=float, default=10)
+    p.add_argument("--latency", type=float, default=1.0)
+    p.set_defaults(func=bench_codecs)
+
+    p = sub.add_parser("decode", help="parallel segment decoding of a long file")
+    p.add_argument("--input", help="media file (default: synthetic mp3)")
+    p.add_argument("--hours", type=float, default=3)
+    p.add_argument("--chunk-duration", type=int, default=300)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser("ratelimit", help="live calls vs file job under a shared quota")
+    p.add_argument("--quota-rpm", type=int, default=30, help="requests allowed per window")
+    p.add_argument("--window", type=float, default=6.0, help="quota window in seconds (60 in production)")
+    p.add_argument("--reserve", type=float, default=0.25)
+    p.add_argument("--chunks", type=int, default=80)
+    p.add_argument("--chunk-duration", type=int, default=1)
+    p.add_argument("--parallelism", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--live-interval", type=float, default=0.5)
+    p.set_defaults(func=bench_ratelimit)
+
+    p = sub.add_parser("cancel", help="cancel-to-release time of a file job")
+    p.add_argument("--minutes", type=float, default=120)
+    p.add_argument("--after", type=float, default=1.0, help="seconds before cancelling")
+    p.add_argument("--latency", type=float, default=3.0)
+    p.set_defaults(func=bench_cancel)
+
+    p = sub.add_parser("local-prompts", help="local Smart Prompt fast path vs Gemini")
+    p.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"),
+                   help="compare with Gemini (default: $GEMINI_API_KEY; local only if unset)")
+    p.add_argument("--repeat", type=int, default=1000)
+    p.set_defaults(func=bench_local_prompts)
+
+    p = sub.add_parser("history", help="history full-text search latency")
+    p.add_argument("--entries", type=int, default=100000)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser("profiler", help="overhead of the profiling modes")
+    p.add_argument("--jobs", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_profiler)
+
+    p = sub.add_parser("render", help="GUI stall when showing large file transcripts")
+    p.add_argument("--chars", type=int, default=500000)
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser("logging", help="logging cost per dictation")
+    p.add_argument("--dictations", type=int, default=2000)
+    p.add_argument("--words", type=int, default=60)
+    p.add_argument("--stall-ms", type=float, default=5)
+    p.set_defaults(func=bench_logging)
+
+    p = sub.add_parser("resample", help="native-rate capture resampling cost")
+    p.add_argument("--rates", type=int, nargs="+", default=[44100, 48000, 96000])
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--block", type=int, default=1024, help="PortAudio block size")
+    p.set_defaults(func=bench_resample)
+
+    p = sub.add_parser("capture", help="peak memory of long recordings")
+    p.add_argument("--minutes", type=float, default=60)
+    p.set_defaults(func=bench_capture)
+
+    args = parser.parse_args()
+    # Workers built by the benches must not write to the user's history or journals
+    sandbox = tempfile.mkdtemp()
+    main.HISTORY_DB = os.path.join(sandbox, "history.sqlite3")
+    main.JOBS_DIR = os.path.join(sandbox, "jobs")
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -5,37 +5,113 @@ import time
 import math
 import queue
 import tempfile
+import hashlib
+import sqlite3
+import random
+import re
+import wave
 import threading
 import traceback
 import logging
+import logging.handlers
+import atexit
+import contextlib
+import cProfile
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
 import subprocess
 import shutil
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import numpy as np
 import sounddevice as sd
 import pyautogui
-from pynput import keyboard
+from pynput import keyboard, mouse
 from google import genai
+from google.genai import types as genai_types
 import scipy.io.wavfile as wav
+from scipy.signal import resample_poly, firwin
 
 from PyQt6.QtWidgets import (QApplication, QSystemTrayIcon, QMenu, QWidget, 
                             QInputDialog, QMessageBox, QFrame, QMainWindow,
                             QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-                            QComboBox, QProgressBar, QTextEdit, QFileDialog,
-                            QGroupBox, QGridLayout, QScrollArea, QSizePolicy)
+                            QComboBox, QProgressBar, QPlainTextEdit, QFileDialog,
+                            QGroupBox, QGridLayout, QScrollArea, QSizePolicy,
+                            QLineEdit, QListWidget, QListWidgetItem)
 from PyQt6.QtCore import (Qt, QTimer, QThread, pyqtSignal, QObject, 
                          QPoint, QRectF, QSize)
 from PyQt6.QtGui import (QPainter, QColor, QPainterPath, QPen, QIcon, 
-                        QAction, QBrush, QLinearGradient, QFont, QPalette, QPixmap)
+                        QAction, QBrush, QLinearGradient, QFont, QPalette, QPixmap,
+                        QTextCursor)
 
 # Configure Logging
-logging.basicConfig(
-    filename='/tmp/darhisper_debug.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+LOG_FILE = '/tmp/darhisper_debug.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+_log_listener = None
+
+
+def setup_logging(level=None):
+    """Route records through a queue so the hot path never touches the disk.
+
+    A QueueListener thread owns the rotating file handler; callers only
+    pay for enqueueing records at or above the configured level.
+    """
+    level = level or os.environ.get("DARHISPER_LOG_LEVEL", "INFO")
+    log_file = LOG_FILE
+    if multiprocessing.parent_process() is not None:
+        # ASR server processes get their own file so rotation never races
+        log_file = LOG_FILE.replace(".log", "_asr.log")
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    
+    global _log_listener
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    set_log_level(level)
+    return _log_listener
+
+
+def stop_logging():
+    """Flush pending records and close the log file."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+def set_log_level(level):
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    logging.getLogger().setLevel(level)
+
+
+setup_logging()
+atexit.register(stop_logging)
 
 CONFIG_FILE = os.path.expanduser("~/.darhisper_config.json")
+CACHE_FILE = os.path.expanduser("~/.darhisper_cache.json")
+JOBS_DIR = os.path.expanduser("~/.darhisper_jobs")
+HISTORY_DB = os.path.expanduser("~/.darhisper_history.sqlite3")
 SAMPLE_RATE = 16000
+# Recordings longer than this spill from RAM to a temp WAV on disk
+SPILL_THRESHOLD_SECONDS = 120
+# Long recordings are fed to the ASR model in segments of this length
+ASR_SEGMENT_SECONDS = 300
+SMART_PROMPT_MODEL = "gemini-1.5-flash"
 
 SMART_PROMPTS = {
     "Transcripción Literal": """Actúa como un motor de transcripción profesional (ASR). Tu única tarea es convertir el audio adjunto en texto plano.
@@ -60,6 +136,31 @@ Salida limpia: NO añadas frases como "Aquí tienes la transcripción", "Claro",
 Salida limpia: NO añadas frases como "Aquí tienes la transcripción", "Claro", ni comillas al principio o final. Solo el texto del audio formateado de la manera que te pide el prompt."""
 }
 
+# Codecs for file-chunk uploads. bytes_per_second is a planning estimate
+# (None = exact PCM rate of the source WAV).
+UPLOAD_CODECS = {
+    "wav": {"label": "WAV (sin comprimir)", "suffix": ".wav", "mime": "audio/wav",
+            "args": None, "bytes_per_second": None},
+    "flac": {"label": "FLAC (sin pérdida)", "suffix": ".flac", "mime": "audio/flac",
+             "args": ['-c:a', 'flac', '-compression_level', '5'], "bytes_per_second": 20000},
+    "opus": {"label": "Opus 24 kbps", "suffix": ".ogg", "mime": "audio/ogg",
+             "args": ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'], "bytes_per_second": 3000},
+}
+DEFAULT_UPLOAD_CODEC = "flac"
+# Chunks up to this size are sent inline in the request instead of through
+# the Files API (the whole request must stay under 20 MB after base64)
+INLINE_MAX_BYTES = 14 * 1024 * 1024
+# Slowest uplink a chunk deadline allows for, on top of the base deadline
+UPLOAD_MIN_BYTES_PER_SECOND = 64 * 1024
+
+# Live (microphone) ASR models: NeMo pretrained name -> display name
+ASR_MODELS = {
+    "nvidia/parakeet-tdt-0.6b-v3": "Parakeet TDT 0.6B v3 (multilingüe)",
+    "nvidia/parakeet-tdt-0.6b-v2": "Parakeet TDT 0.6B v2 (inglés)",
+    "nvidia/stt_es_fastconformer_hybrid_large_pc": "FastConformer Large (español)",
+}
+DEFAULT_ASR_MODEL = "nvidia/parakeet-tdt-0.6b-v3"
+
 # Shortcut presets for Linux
 SHORTCUT_PRESETS = {
     "F5": {keyboard.Key.f5},
@@ -67,13 +168,1370 @@ SHORTCUT_PRESETS = {
     "Control Derecho": {keyboard.Key.ctrl_r}
 }
 
+# Seconds the Smart Prompt result may take after the raw text was pasted
+# before the optimistic paste is considered final
+OPTIMISTIC_DEADLINE = 10.0
+
+# End-to-end seconds from key release to paste before the Smart Prompt
+# step is abandoned and the raw Parakeet text is pasted instead
+LATENCY_BUDGET = 6.0
+
+# File transcripts are appended to the output view as chunks finish, at
+# most this often and this many characters per GUI-thread turn
+RENDER_INTERVAL_MS = 33
+RENDER_BATCH_CHARS = 32 * 1024
+
+
+# --- Metrics ---
+class Metrics:
+    """Thread-safe counters and timing samples, summarized into the debug log."""
+
+    def __init__(self, max_samples=500):
+        self._lock = threading.Lock()
+        self.max_samples = max_samples
+        self.counters = {}
+        self.timings = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self.timings.setdefault(name, [])
+            samples.append(seconds)
+            if len(samples) > self.max_samples:
+                del samples[0]
+        logging.debug("[metrics] %s: %.1f ms", name, seconds * 1000)
+
+    def summary(self, name):
+        with self._lock:
+            samples = sorted(self.timings.get(name, []))
+        if not samples:
+            return None
+        return {
+            "count": len(samples),
+            "mean": sum(samples) / len(samples),
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+
+    def report(self):
+        with self._lock:
+            counters = dict(self.counters)
+            names = list(self.timings.keys())
+        for name, value in sorted(counters.items()):
+            logging.info("[metrics] %s = %s", name, value)
+        hits = counters.get("smart_cache.hit", 0)
+        lookups = hits + counters.get("smart_cache.miss", 0)
+        if lookups:
+            logging.info("[metrics] smart_cache.hit_rate = %.1f%%", hits / lookups * 100)
+        for name in sorted(names):
+            s = self.summary(name)
+            if s:
+                logging.info(
+                    "[metrics] %s: n=%d mean=%.1f ms p50=%.1f ms p95=%.1f ms",
+                    name, s['count'], s['mean'] * 1000, s['p50'] * 1000, s['p95'] * 1000
+                )
+
+
+METRICS = Metrics()
+
+
+# --- Profiling ---
+PROFILE_DIR = os.path.expanduser("~/.darhisper_profiles")
+PROFILE_MODES = ("off", "sample", "cprofile")
+
+
+class JobProfiler:
+    """Opt-in per-job profiles for slow-dictation reports.
+
+    In "sample" mode a daemon thread snapshots every thread's stack (worker,
+    GUI, hotkey listener, Gemini and chunk pools) each ``interval`` seconds
+    while a job runs. The result is written as collapsed stacks
+    (``thread;file:func;... count``) for flamegraph.pl or speedscope.
+    "cprofile" mode also runs cProfile during the job and dumps a .pstats
+    file next to it. Before Python 3.12 that covers the job's own thread;
+    from 3.12 on it covers every thread, and only one profile can be
+    active at a time, so a job overlapping another falls back to sampling.
+    Only the newest ``keep`` jobs are kept.
+    """
+
+    def __init__(self, mode="off", interval=0.05, directory=PROFILE_DIR, keep=50):
+        self.mode = mode if mode in PROFILE_MODES else "off"
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+
+    @contextlib.contextmanager
+    def job(self, name):
+        mode = self.mode
+        if mode == "off":
+            yield
+            return
+        stacks = {}
+        stop = threading.Event()
+        overhead = [0.0]
+        sampler = threading.Thread(
+            target=self._sample, args=(stacks, stop, overhead), name="profiler", daemon=True
+        )
+        profile = cProfile.Profile() if mode == "cprofile" else None
+        start = time.monotonic()
+        try:
+            sampler.start()
+            if profile is not None:
+                try:
+                    profile.enable()
+                except ValueError as e:
+                    # 3.12+: another job's profile is already active
+                    logging.info("cProfile unavailable for %s, sampling only: %s", name, e)
+                    profile = None
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            stop.set()
+            if sampler.ident is not None:
+                sampler.join()
+            try:
+                self._write(name, time.monotonic() - start, stacks, profile, overhead[0])
+            except OSError as e:
+                logging.warning("Could not write profile: %s", e)
+
+    def _sample(self, stacks, stop, overhead):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            t = time.perf_counter()
+            names = {th.ident: th.name for th in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(frames))
+                stacks[key] = stacks.get(key, 0) + 1
+            overhead[0] += time.perf_counter() - t
+
+    def _write(self, name, wall, stacks, profile, overhead):
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+        base = os.path.join(self.directory, f"{stamp}-{name}")
+        with open(base + ".collapsed", 'w', encoding='utf-8') as f:
+            for key, count in sorted(stacks.items()):
+                f.write(f"{key} {count}\n")
+        if profile is not None:
+            profile.dump_stats(base + ".pstats")
+        logging.info(
+            "Profile of %s (%.2fs, sampler overhead %.1f ms) written to %s.collapsed",
+            name, wall, overhead * 1000, base
+        )
+        self._rotate()
+
+    def _rotate(self):
+        jobs = {}
+        for entry in os.listdir(self.directory):
+            jobs.setdefault(os.path.splitext(entry)[0], []).append(entry)
+        for job in sorted(jobs)[:-self.keep]:
+            for entry in jobs[job]:
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+
+PROFILER = JobProfiler()
+
+
+def profiled(name):
+    """Run the decorated job under PROFILER when profiling is on."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with PROFILER.job(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- Smart Prompt Result Cache ---
+class SmartPromptCache:
+    """Bounded LRU of Gemini post-processing results, persisted to disk.
+
+    Keys are (normalized raw text, prompt key, model), so repeated short
+    dictations skip the network round trip entirely. Writes are coalesced
+    on a timer thread ``save_delay`` seconds after the first put; call
+    ``flush()`` before exit.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=500, ttl=30 * 24 * 3600, max_text_len=2000,
+                 save_delay=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_text_len = max_text_len
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._entries = OrderedDict()
+        self.load()
+
+    @staticmethod
+    def normalize(text):
+        # ¿? and ¡! stay: "¿vienes?" and "vienes" must not share a result
+        return " ".join(text.casefold().split()).strip(" .,;:")
+
+    def make_key(self, text, prompt_key, model):
+        return "\x1f".join((self.normalize(text), prompt_key, model))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logging.warning("Ignoring unreadable cache file: %s", e)
+            return
+        now = time.time()
+        entries = OrderedDict()
+        try:
+            for key, value, stamp in data:
+                if now - stamp < self.ttl:
+                    entries[str(key)] = (str(value), float(stamp))
+        except (TypeError, ValueError, AttributeError) as e:
+            logging.warning("Ignoring malformed cache file: %s", e)
+            return
+        with self._lock:
+            self._entries = entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                data = [[k, v, t] for k, (v, t) in self._entries.items()]
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logging.error("Error saving cache: %s", e)
+
+    def schedule_save(self):
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes now, if any."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    def get(self, text, prompt_key, model):
+        key = self.make_key(text, prompt_key, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        METRICS.incr("smart_cache.hit" if entry is not None else "smart_cache.miss")
+        return entry[0] if entry is not None else None
+
+    def put(self, text, prompt_key, model, result):
+        if len(text) > self.max_text_len or len(result) > self.max_text_len:
+            return
+        key = self.make_key(text, prompt_key, model)
+        with self._lock:
+            self._entries[key] = (result, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.schedule_save()
+
+
+# --- Local Smart Prompt Fast Path ---
+# Pure hesitation sounds are always dropped; words that are also real
+# Spanish ("este", "bueno", "pues") only when used as a comma-delimited filler
+_HESITATIONS = ["eh", "ehm", "em", "emm", "mm", "mmm", "hmm", "ah", "aja"]
+_COMMA_FILLERS = ["este", "o sea", "bueno", "pues", "vale", "en plan", "digamos"]
+
+
+def _word_alternation(words):
+    # Longest first so "o sea" wins over shorter prefixes
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_HESITATION_RE = re.compile(
+    rf"(?<!\w)(?:{_word_alternation(_HESITATIONS)})(?!\w)[,.]?\s*", re.IGNORECASE
+)
+_COMMA_FILLER_RE = re.compile(
+    rf"(?:^|(?<=[,.;:!?]\s)|(?<=[¿¡]))(?:{_word_alternation(_COMMA_FILLERS)}),\s*", re.IGNORECASE
+)
+# Stutters only: numbers ("10 10") and negations ("no no no") are often deliberate
+_REPEATED_WORD_RE = re.compile(
+    r"\b(?!(?:no|ni|nunca|jamás)\b)([^\W\d_]+)(?:\s+\1\b)+", re.IGNORECASE
+)
+# "¿Eh?" minus the hesitation leaves an empty "¿?"
+_EMPTY_INVERTED_RE = re.compile(r"¿\s*\?\s*|¡\s*!\s*")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.;:!?])")
+_MULTISPACE_RE = re.compile(r"\s{2,}")
+_DOUBLE_PUNCT_RE = re.compile(r"([,.;:])[,.;:]+")
+_SENTENCE_START_RE = re.compile(r"(^|[.!?]\s+|[¿¡])([a-záéíóúñü])")
+# Sequencing connectives separate items only at the start of a clause
+_TODO_CONNECTIVES = r"(?:y\s+)?(?:luego|después|además|también)\b,?\s*"
+_TODO_SPLIT_RE = re.compile(
+    # Sentence-ending periods only, so "1.5" and "3.30" stay whole
+    rf"(?:\.(?=\s|$)|[;\n])\s*|,\s*{_TODO_CONNECTIVES}", re.IGNORECASE
+)
+_TODO_LEADING_CONNECTIVE_RE = re.compile(rf"^{_TODO_CONNECTIVES}(?=\S)", re.IGNORECASE)
+
+
+def local_cleanup(text):
+    """Filler removal, stutter collapse, spacing and capitalization."""
+    text = _HESITATION_RE.sub("", text)
+    text = _EMPTY_INVERTED_RE.sub("", text)
+    text = _COMMA_FILLER_RE.sub("", text)
+    text = _REPEATED_WORD_RE.sub(r"\1", text)
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+    text = _DOUBLE_PUNCT_RE.sub(r"\1", text)
+    text = _MULTISPACE_RE.sub(" ", text).strip(" ,;")
+    return _SENTENCE_START_RE.sub(lambda m: m.group(1) + m.group(2).upper(), text)
+
+
+def local_todo_list(text):
+    """One '- ' bullet per sentence or sequencing connector."""
+    items = []
+    for item in _TODO_SPLIT_RE.split(local_cleanup(text)):
+        item = _TODO_LEADING_CONNECTIVE_RE.sub("", item.strip(" ,;:.")).strip(" ,;:.")
+        if item:
+            items.append("- " + item[0].upper() + item[1:])
+    return "\n".join(items)
+
+
+# Smart Prompt modes that can run locally instead of calling Gemini
+LOCAL_PROMPT_PROCESSORS = {
+    "Transcripción Literal": local_cleanup,
+    "Lista de Tareas (To-Do)": local_todo_list,
+}
+
+
+# --- Gemini Call Resilience ---
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable_error(e):
+    """True for rate limits, server errors and transport failures."""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    return type(e).__module__.split(".")[0] in ("httpx", "httpcore")
+
+
+class ResilientCaller:
+    """Runs Gemini calls with per-call deadlines, jittered exponential
+    backoff for retryable errors and optional hedging of stragglers.
+
+    With hedging enabled, a duplicate call is started once the first one
+    has been running longer than the observed p95 for that call name, and
+    whichever answers first wins. Abandoned calls are left to finish in
+    the pool; their results are discarded. Pass an ``attempts`` list to
+    call() to collect every attempt future, so callers can clean up after
+    attempts that outlive the call. ``fn`` is called with ``hedge``, True
+    only for a hedged duplicate (never for a retry), and ``deadline``
+    overrides the per-attempt deadline for one call.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, deadline=180.0,
+                 hedge=False, hedge_min_delay=5.0, hedge_min_samples=5, max_workers=8):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+
+    def call(self, name, fn, attempts=None, deadline=None):
+        start = time.monotonic()
+        for attempt in range(self.max_attempts):
+            try:
+                result = self._call_once(name, fn, attempts, deadline)
+                METRICS.record(f"gemini.{name}.total", time.monotonic() - start)
+                return result
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not is_retryable_error(e):
+                    raise
+                # Full jitter keeps concurrent chunks from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logging.warning("Gemini %s failed (%s), retry %d in %.1fs", name, e, attempt + 1, delay)
+                METRICS.incr(f"gemini.{name}.retries")
+                time.sleep(delay)
+
+    def hedge_delay(self, name):
+        if not self.hedge:
+            return None
+        s = METRICS.summary(f"gemini.{name}")
+        if s is None or s["count"] < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, s["p95"])
+
+    def _submit(self, fn, attempts, hedge=False):
+        future = self.executor.submit(fn, hedge)
+        if attempts is not None:
+            attempts.append(future)
+        return future
+
+    def _call_once(self, name, fn, attempts=None, deadline=None):
+        deadline = deadline or self.deadline
+        start = time.monotonic()
+        futures = {self._submit(fn, attempts)}
+        hedge_at = self.hedge_delay(name)
+        last_error = None
+        while futures:
+            now = time.monotonic() - start
+            if now >= deadline:
+                METRICS.incr(f"gemini.{name}.deadline_exceeded")
+                raise TimeoutError(f"Gemini {name} superó el límite de {deadline:.0f}s")
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    METRICS.record(f"gemini.{name}", time.monotonic() - start)
+                    return future.result()
+                last_error = future.exception()
+            if hedge_at is not None and futures and time.monotonic() - start >= hedge_at:
+                logging.info("Hedging Gemini %s after %.1fs", name, hedge_at)
+                METRICS.incr(f"gemini.{name}.hedged")
+                futures.add(self._submit(fn, attempts, hedge=True))
+                hedge_at = None
+        raise last_error
+
+
+# --- Gemini Rate Limiting ---
+# Gemini bills audio input at a fixed rate per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+
+def estimate_text_tokens(text):
+    return len(text) // 4 + 1
+
+
+def is_rate_limited(e):
+    return getattr(e, "code", None) == 429 or getattr(e, "status_code", None) == 429
+
+
+class HedgeSkipped(Exception):
+    """A hedged duplicate was not sent because the quota had no spare room."""
+
+
+class RateLimiter:
+    """Sliding-window requests-per-minute and tokens-per-minute limits,
+    shared by every Gemini call made with the app's API key.
+
+    Granted requests are logged with their token cost. A request only goes
+    out while the log for the last ``period`` seconds stays within quota,
+    which is how the API counts, so no window can exceed ``rpm`` or
+    ``tpm``. Background (file chunk) calls may only fill the window up to
+    ``1 - reserve`` of the quota, leaving headroom for live dictations.
+    A 429 pauses every caller until the oldest logged request leaves the
+    window. A limit of 0 disables that check.
+    """
+
+    def __init__(self, rpm=60, tpm=1_000_000, reserve=0.25, period=60.0):
+        self._cond = threading.Condition()
+        self.period = period
+        self.log = deque()  # (granted at, tokens)
+        self.log_tokens = 0
+        self.paused_until = 0.0
+        self.configure(rpm, tpm, reserve)
+
+    def configure(self, rpm, tpm, reserve):
+        with self._cond:
+            self.rpm = rpm
+            self.tpm = tpm
+            self.reserve = reserve
+            self._cond.notify_all()
+
+    def _cost(self, tokens, share):
+        # A single request bigger than the quota would never fit
+        return min(tokens, self.tpm * share) if self.tpm else tokens
+
+    def _delay(self, cost, share, now):
+        """Seconds until a request of ``cost`` tokens fits; 0 if it fits now."""
+        while self.log and now - self.log[0][0] >= self.period:
+            self.log_tokens -= self.log.popleft()[1]
+        delay = max(0.0, self.paused_until - now)
+        if self.rpm:
+            excess = len(self.log) + 1 - max(1, int(self.rpm * share))
+            if excess > 0:
+                delay = max(delay, self.log[excess - 1][0] + self.period - now)
+        if self.tpm:
+            over = self.log_tokens + cost - self.tpm * share
+            freed = 0
+            for granted, tokens in self.log:
+                if freed >= over:
+                    break
+                freed += tokens
+                delay = max(delay, granted + self.period - now)
+        return delay
+
+    def acquire(self, kind, tokens, live=False, cancel=None):
+        """Block until one request of ``tokens`` fits; return seconds waited."""
+        share = 1.0 if live else 1.0 - self.reserve
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                cost = self._cost(tokens, share)
+                delay = self._delay(cost, share, now)
+                if delay <= 0:
+                    self.log.append((now, cost))
+                    self.log_tokens += cost
+                    break
+                if cancel is not None:
+                    cancel.check()
+                    delay = min(delay, 0.25)
+                self._cond.wait(max(delay, 0.01))
+        waited = time.monotonic() - start
+        METRICS.record(f"ratelimit.wait.{kind}", waited)
+        if waited > 0.01:
+            METRICS.incr(f"ratelimit.throttled.{kind}")
+            METRICS.incr(f"ratelimit.wait_seconds.{kind}", waited)
+        return waited
+
+    def try_acquire(self, kind, tokens):
+        """Take background headroom only if it is free right now."""
+        share = 1.0 - self.reserve
+        with self._cond:
+            now = time.monotonic()
+            cost = self._cost(tokens, share)
+            if self._delay(cost, share, now) > 0:
+                METRICS.incr(f"ratelimit.skipped.{kind}")
+                return False
+            self.log.append((now, cost))
+            self.log_tokens += cost
+            return True
+
+    def note_error(self, e):
+        """Feed a failed call back into the limiter."""
+        if not is_rate_limited(e):
+            return
+        METRICS.incr("ratelimit.server_429")
+        with self._cond:
+            now = time.monotonic()
+            if self.log:
+                resume = self.log[0][0] + self.period
+            else:
+                resume = now + (self.period / self.rpm if self.rpm else 1.0)
+            self.paused_until = max(self.paused_until, min(resume, now + self.period))
+
+
+# --- File Chunk Planning ---
+class ChunkPlanner:
+    """Chooses the chunk length for a file job.
+
+    Short files are split so every chunk can be in flight at once (lowest
+    latency); long files use the largest chunks allowed by the payload cap
+    and the per-chunk latency target, rounded so the last wave of requests
+    is full. The per-chunk latency model is learned from finished chunks.
+    """
+
+    def __init__(self, parallelism=4, target_in_flight=None, min_chunk=20, max_chunk=600,
+                 max_payload_bytes=20 * 1024 * 1024, latency_target=90.0):
+        self.parallelism = parallelism
+        self.target_in_flight = target_in_flight
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.max_payload_bytes = max_payload_bytes
+        self.latency_target = latency_target
+        # Seconds of request latency per second of audio (EWMA)
+        self.seconds_per_audio_second = None
+        self._lock = threading.Lock()
+
+    def plan(self, total_duration, bytes_per_second):
+        in_flight = self.target_in_flight or self.parallelism
+        upper = min(self.max_chunk, self.max_payload_bytes / bytes_per_second)
+        with self._lock:
+            rate = self.seconds_per_audio_second
+        if rate:
+            upper = min(upper, max(self.min_chunk, self.latency_target / rate))
+        
+        waves = max(1, math.ceil(total_duration / (upper * in_flight)))
+        chunk = total_duration / (waves * in_flight)
+        chunk = math.ceil(max(self.min_chunk, min(upper, chunk)))
+        
+        logging.info(
+            "Chunk plan: %.0fs audio, parallelism=%d, in_flight=%d, upper=%.0fs, "
+            "rate=%.3fs/s -> %ds chunks (%d chunks)",
+            total_duration, self.parallelism, in_flight, upper,
+            rate or 0, chunk, math.ceil(total_duration / chunk)
+        )
+        return chunk
+
+    def observe(self, chunk_seconds, latency):
+        if chunk_seconds <= 0:
+            return
+        sample = latency / chunk_seconds
+        with self._lock:
+            if self.seconds_per_audio_second is None:
+                self.seconds_per_audio_second = sample
+            else:
+                self.seconds_per_audio_second = 0.8 * self.seconds_per_audio_second + 0.2 * sample
+
+
+def wav_duration(path):
+    with wave.open(path, 'rb') as w:
+        return w.getnframes() / w.getframerate(), w.getframerate() * w.getsampwidth() * w.getnchannels()
+
+
+# --- File Job Cancellation ---
+class JobCancelled(Exception):
+    """Raised inside a file job once the user has cancelled it."""
+
+
+class CancelToken:
+    """Cooperative cancellation for one file job.
+
+    Job code calls check() between steps. Subprocesses started through
+    run_process() are killed as soon as cancel() is called, so a long
+    ffmpeg conversion stops immediately instead of running to the end.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs = set()
+        self.cancelled_at = None
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def run_process(self, cmd, input=None, timeout=None, capture_output=True, **kwargs):
+        """subprocess.run() replacement that cancel() can interrupt."""
+        self.check()
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs
+        )
+        with self._lock:
+            self._procs.add(proc)
+            if self._event.is_set():
+                proc.kill()
+        try:
+            stdout, stderr = proc.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        self.check()
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+# --- Upload Encoding ---
+def find_ffmpeg():
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        for p in ["/usr/bin/ffmpeg", "/usr/local/bin/ffmpeg"]:
+            if os.path.exists(p):
+                ffmpeg_path = p
+                break
+    
+    if not ffmpeg_path:
+        raise Exception("ffmpeg no encontrado. Instálalo con: sudo apt install ffmpeg")
+    return ffmpeg_path
+
+
+def encode_audio_chunk(chunk_audio, sr, codec, cancel=None):
+    """Write an int16 chunk to a temp file in ``codec`` and return its path.
+
+    Compressed codecs pipe raw PCM through ffmpeg; if encoding fails the
+    chunk falls back to WAV so the job can still finish. A ``cancel``
+    token kills the encoder when the job is cancelled.
+    """
+    spec = UPLOAD_CODECS.get(codec, UPLOAD_CODECS["wav"])
+    start = time.monotonic()
+    ffmpeg_path = None
+    if spec["args"] is not None:
+        try:
+            ffmpeg_path = find_ffmpeg()
+        except Exception as e:
+            logging.warning("Cannot encode %s, uploading WAV: %s", codec, e)
+    if ffmpeg_path is not None:
+        path = tempfile.NamedTemporaryFile(suffix=spec["suffix"], delete=False).name
+        cmd = [
+            ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0',
+            *spec["args"], '-y', path
+        ]
+        run = cancel.run_process if cancel is not None else subprocess.run
+        try:
+            result = run(
+                cmd,
+                input=np.ascontiguousarray(chunk_audio, dtype=np.int16).tobytes(),
+                capture_output=True,
+                timeout=300
+            )
+            if result.returncode == 0:
+                METRICS.record(f"encode.{codec}", time.monotonic() - start)
+                return path
+            logging.warning("ffmpeg %s encode failed, uploading WAV: %s",
+                            codec, result.stderr.decode('utf-8', 'replace'))
+        except JobCancelled:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        except Exception as e:
+            logging.warning("ffmpeg %s encode failed, uploading WAV: %s", codec, e)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    path = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+    wav.write(path, sr, chunk_audio)
+    return path
+
+
+# --- File Audio Sources ---
+def probe_duration(path):
+    """Media duration in seconds via ffprobe, or None if it cannot be read."""
+    ffprobe_path = shutil.which("ffprobe") or os.path.join(os.path.dirname(find_ffmpeg()), "ffprobe")
+    try:
+        result = subprocess.run(
+            [ffprobe_path, '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', path],
+            capture_output=True, encoding='utf-8', errors='replace', timeout=60
+        )
+        return float(result.stdout.strip()) if result.returncode == 0 else None
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+class WavSource:
+    """Chunk source over a converted 16-bit WAV, read lazily through mmap."""
+
+    def __init__(self, path):
+        self.sr, self.audio = wav.read(path, mmap=True)
+        self.total_samples = len(self.audio)
+
+    def read(self, start_idx, end_idx):
+        return self.audio[start_idx:end_idx]
+
+
+class FfmpegRangeSource:
+    """Chunk source that decodes each time range of the original media
+    file on demand with ``ffmpeg -ss/-t``.
+
+    Chunk threads call read() concurrently, so decoding of independent
+    ranges runs in parallel, bounded to ``workers`` ffmpeg processes.
+    """
+
+    def __init__(self, path, duration, workers, sr=SAMPLE_RATE, cancel=None):
+        self.path = path
+        self.sr = sr
+        self.cancel = cancel
+        self.total_samples = int(duration * sr)
+        self.ffmpeg_path = find_ffmpeg()
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+
+    def read(self, start_idx, end_idx):
+        cmd = [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-ss', f"{start_idx / self.sr:.3f}", '-t', f"{(end_idx - start_idx) / self.sr:.3f}",
+            '-i', self.path, '-vn', '-ar', str(self.sr), '-ac', '1', '-f', 's16le', 'pipe:1'
+        ]
+        run = self.cancel.run_process if self.cancel is not None else subprocess.run
+        with self._slots:
+            start = time.monotonic()
+            result = run(cmd, capture_output=True, timeout=300)
+            METRICS.record("decode.segment", time.monotonic() - start)
+        if result.returncode != 0:
+            raise Exception(f"Error convirtiendo audio: {result.stderr.decode('utf-8', 'replace')}")
+        return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+# --- File Job Checkpoints ---
+class ChunkJournal:
+    """Append-only, fsync'd journal of finished chunks for one file job.
+
+    The first line is the job header (file, prompt, model, chunk length);
+    every following line records one finished chunk. A job whose journal
+    still exists was interrupted and can be resumed from its first missing
+    chunk.
+    """
+
+    # Journals of jobs running in this process; they are not interrupted
+    active = set()
+
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.chunks = {}
+        if os.path.exists(path):
+            self._read()
+
+    @staticmethod
+    def job_id(file_path, prompt_key, model):
+        st = os.stat(file_path)
+        ident = f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}|{prompt_key}|{model}"
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def for_job(cls, file_path, prompt_key, model):
+        job_id = cls.job_id(file_path, prompt_key, model)
+        return cls(os.path.join(JOBS_DIR, f"{job_id}.jsonl"))
+
+    @classmethod
+    def list_interrupted(cls):
+        if not os.path.isdir(JOBS_DIR):
+            return []
+        journals = []
+        for name in sorted(os.listdir(JOBS_DIR)):
+            path = os.path.join(JOBS_DIR, name)
+            if not name.endswith(".jsonl") or path in cls.active:
+                continue
+            journal = cls(path)
+            if journal.is_current():
+                journals.append(journal)
+            else:
+                # Source file gone or changed since: its chunks no longer apply
+                journal.finish()
+        return journals
+
+    def is_current(self):
+        """Whether the source file still matches the job this journal was written for."""
+        if not self.header:
+            return False
+        try:
+            job_id = self.job_id(self.header["file"], self.header["prompt_key"], self.header["model"])
+        except (OSError, KeyError):
+            return False
+        return os.path.basename(self.path) == f"{job_id}.jsonl"
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line from a crash mid-write
+                    continue
+                if entry.get("type") == "job":
+                    self.header = entry
+                elif entry.get("type") == "chunk":
+                    self.chunks[entry["index"]] = entry["text"]
+
+    def _append(self, entry):
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, file_path, prompt_key, model, chunk_duration):
+        if self.header is not None:
+            return
+        self.header = {
+            "type": "job",
+            "file": os.path.abspath(file_path),
+            "prompt_key": prompt_key,
+            "model": model,
+            "chunk_duration": chunk_duration,
+            "created": time.time(),
+        }
+        self._append(self.header)
+
+    def record_chunk(self, index, start, end, text):
+        self.chunks[index] = text
+        self._append({"type": "chunk", "index": index, "start": start, "end": end, "text": text})
+
+    def finish(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# --- ASR Model Registry ---
+class ASRModelRegistry:
+    """Keeps several NeMo ASR models loaded under RAM/VRAM budgets.
+
+    The active model lives on the GPU. When the VRAM budget is exceeded,
+    the least recently used models are offloaded to CPU; when the RAM
+    budget is exceeded, the least recently used CPU models are dropped.
+    Any model can be brought back on demand. Load, evict and reload
+    times go to the metrics.
+    """
+
+    def __init__(self, vram_budget_mb=6000, ram_budget_mb=8000):
+        self.vram_budget = vram_budget_mb * 1024 * 1024
+        self.ram_budget = ram_budget_mb * 1024 * 1024
+        self.entries = OrderedDict()  # name -> {"model", "device", "bytes"}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _target_device():
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    @staticmethod
+    def _model_bytes(model):
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+
+    def is_resident(self, name):
+        with self._lock:
+            entry = self.entries.get(name)
+            return entry is not None and entry["device"] == self._target_device()
+
+    def get(self, name):
+        """Return ``name`` ready for inference, loading or moving it if needed."""
+        with self._lock:
+            target = self._target_device()
+            entry = self.entries.get(name)
+            start = time.monotonic()
+            
+            if entry is None:
+                import nemo.collections.asr as nemo_asr
+                logging.info("Loading ASR model %s", name)
+                model = nemo_asr.models.ASRModel.from_pretrained(model_name=name)
+                model = model.to(target)
+                model.eval()
+                entry = {"model": model, "device": target, "bytes": self._model_bytes(model)}
+                self.entries[name] = entry
+                METRICS.record("asr_model.load", time.monotonic() - start)
+            elif entry["device"] != target:
+                entry["model"] = entry["model"].to(target)
+                entry["device"] = target
+                METRICS.record("asr_model.reload", time.monotonic() - start)
+            
+            self.entries.move_to_end(name)
+            self._enforce_budgets(keep=name)
+            return entry["model"]
+
+    def _used(self, device):
+        return sum(e["bytes"] for e in self.entries.values() if e["device"] == device)
+
+    def _enforce_budgets(self, keep):
+        for name in list(self.entries):
+            if self._used("cuda") <= self.vram_budget:
+                break
+            entry = self.entries[name]
+            if name != keep and entry["device"] == "cuda":
+                self.offload(name)
+        for name in list(self.entries):
+            if self._used("cpu") <= self.ram_budget:
+                break
+            if name != keep and self.entries[name]["device"] == "cpu":
+                self.unload(name)
+
+    def offload(self, name):
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None or entry["device"] == "cpu":
+                return
+            start = time.monotonic()
+            entry["model"] = entry["model"].to("cpu")
+            entry["device"] = "cpu"
+            self._empty_cuda_cache()
+            METRICS.record("asr_model.evict", time.monotonic() - start)
+            logging.info("Offloaded ASR model %s to CPU", name)
+
+    def unload(self, name):
+        with self._lock:
+            if self.entries.pop(name, None) is None:
+                return
+            import gc
+            gc.collect()
+            self._empty_cuda_cache()
+            METRICS.incr("asr_model.unloaded")
+            logging.info("Unloaded ASR model %s", name)
+
+    @staticmethod
+    def memory_snapshot():
+        """Process RSS and allocated VRAM in MB, for logging."""
+        rss = 0.0
+        try:
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+        except (OSError, ValueError, IndexError):
+            pass
+        vram = 0.0
+        try:
+            import torch
+            if torch.cuda.is_available():
+                vram = torch.cuda.memory_allocated() / 1e6
+        except ImportError:
+            pass
+        return rss, vram
+
+    @staticmethod
+    def _empty_cuda_cache():
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# --- Transcript History ---
+class HistoryStore:
+    """Persistent SQLite history of dictations and file transcripts with an
+    FTS5 full-text index.
+
+    add() only enqueues; a background thread writes entries in batched
+    transactions, so recording history never delays pasting. Searches use
+    their own connection (WAL mode lets them run alongside writes). Call
+    close() before exit so queued entries are not lost.
+    """
+
+    def __init__(self, path=None, batch_window=0.5, max_batch=200):
+        self.path = path or HISTORY_DB
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.fts = True
+        self._queue = queue.Queue()
+        self._read_conn = None
+        self._init_schema()
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY, created REAL NOT NULL, kind TEXT NOT NULL, "
+                "mode TEXT, model TEXT, duration REAL, timings TEXT, text TEXT NOT NULL)"
+            )
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts "
+                    "USING fts5(text, content='entries', content_rowid='id')"
+                )
+                conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN "
+                    "INSERT INTO entries_fts(rowid, text) VALUES (new.id, new.text); END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN "
+                    "INSERT INTO entries_fts(entries_fts, rowid, text) VALUES ('delete', old.id, old.text); END"
+                )
+            except sqlite3.OperationalError as e:
+                logging.warning("FTS5 unavailable, history search falls back to LIKE: %s", e)
+                self.fts = False
+        conn.close()
+
+    def add(self, kind, mode, model, duration, timings, text):
+        self._queue.put((time.time(), kind, mode, model, duration, json.dumps(timings), text))
+
+    def close(self, timeout=10.0):
+        """Write every queued entry, then stop the writer thread."""
+        self._queue.put(None)  # sentinel; entries are tuples
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logging.warning("History writer still busy after %.0fs, entries may be lost", timeout)
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+
+    def _write_loop(self):
+        conn = self._connect()
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            # Stop waiting for more once the sentinel arrives
+            while len(batch) < self.max_batch and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                closing = True
+            if not batch:
+                continue
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO entries (created, kind, mode, model, duration, timings, text) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                    )
+            except sqlite3.Error as e:
+                logging.error("History write failed (%d entries): %s", len(batch), e)
+        conn.close()
+
+    @staticmethod
+    def _fts_query(query):
+        # Every word must match, as a prefix; quotes keep FTS syntax inert
+        words = re.findall(r"\w+", query)
+        return " ".join(f'"{w}"*' for w in words)
+
+    def search(self, query, limit=200):
+        """Newest entries matching ``query`` (all of them if it is empty).
+
+        Call from a single thread (the GUI thread); the read connection is
+        created on first use.
+        """
+        if self._read_conn is None:
+            self._read_conn = self._connect()
+        columns = "e.id, e.created, e.kind, e.mode, e.model, e.duration, e.timings, e.text"
+        match = self._fts_query(query) if query else ""
+        if not match:
+            sql = f"SELECT {columns} FROM entries e ORDER BY e.id DESC LIMIT ?"
+            params = (limit,)
+        elif self.fts:
+            sql = (f"SELECT {columns} FROM entries_fts f JOIN entries e ON e.id = f.rowid "
+                   f"WHERE entries_fts MATCH ? ORDER BY f.rowid DESC LIMIT ?")
+            params = (match, limit)
+        else:
+            sql = f"SELECT {columns} FROM entries e WHERE e.text LIKE ? ORDER BY e.id DESC LIMIT ?"
+            params = (f"%{query}%", limit)
+        start = time.perf_counter()
+        rows = self._read_conn.execute(sql, params).fetchall()
+        METRICS.record("history.search", time.perf_counter() - start)
+        return rows
+
+
 # --- Audio Recording Service ---
+class CaptureBuffer:
+    """Holds int16 capture blocks in RAM up to a threshold, then spills
+    everything to a temp WAV file that is appended to block by block.
+
+    finish() returns either an int16 array (short takes) or the path of
+    the spill file, which downstream code reads back one segment at a time.
+    """
+
+    def __init__(self, threshold_samples):
+        self.threshold_samples = threshold_samples
+        self.blocks = []
+        self.num_samples = 0
+        self.spill_path = None
+        self.spill = None
+
+    def append(self, block):
+        self.num_samples += len(block)
+        if self.spill is not None:
+            self.spill.writeframes(block.tobytes())
+            return
+        self.blocks.append(block)
+        if self.num_samples > self.threshold_samples:
+            self._start_spill()
+
+    def _start_spill(self):
+        self.spill_path = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+        self.spill = wave.open(self.spill_path, 'wb')
+        self.spill.setnchannels(1)
+        self.spill.setsampwidth(2)
+        self.spill.setframerate(SAMPLE_RATE)
+        for block in self.blocks:
+            self.spill.writeframes(block.tobytes())
+        self.blocks = []
+        logging.info("Recording spilled to %s", self.spill_path)
+
+    def finish(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+            return self.spill_path
+        if not self.blocks:
+            return None
+        return np.concatenate(self.blocks)
+
+
+class WavSampleReader:
+    """Sliceable int16 samples of a mono 16-bit WAV, read from disk on demand.
+
+    Each slice is a plain file read into a fresh array, so only the range
+    being processed is ever resident, however long the recording is.
+    """
+
+    def __init__(self, path):
+        with wave.open(path, 'rb') as w:
+            self.num_frames = w.getnframes()
+        self.path = path
+        self.offset = os.path.getsize(path) - self.num_frames * 2
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, key):
+        start, stop, step = key.indices(self.num_frames)
+        if step != 1:
+            raise ValueError("WavSampleReader only supports contiguous slices")
+        count = max(0, stop - start)
+        return np.fromfile(self.path, dtype=np.int16, count=count, offset=self.offset + start * 2)
+
+
+def quiet_split_point(audio, target, window):
+    """Index of the quietest 20 ms frame in the ``window`` samples before ``target``."""
+    frame = int(0.02 * SAMPLE_RATE)
+    lo = max(0, target - window)
+    region = np.abs(np.asarray(audio[lo:target], dtype=np.int32))
+    n = len(region) // frame
+    if n == 0:
+        return target
+    energy = region[:n * frame].reshape(n, frame).sum(axis=1)
+    return lo + int(np.argmin(energy)) * frame
+
+
+def write_asr_segments(audio_data):
+    """Write the recording as one or more temp WAVs for NeMo.
+
+    ``audio_data`` is an int16 array or the path of a spilled recording.
+    Spilled recordings are read from disk one segment at a time, split
+    near the quietest point before each boundary.
+    """
+    if isinstance(audio_data, str):
+        audio = WavSampleReader(audio_data)
+    else:
+        audio = audio_data.reshape(-1)
+        if audio.dtype != np.int16:
+            audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    
+    segment = ASR_SEGMENT_SECONDS * SAMPLE_RATE
+    paths = []
+    start = 0
+    while start < len(audio):
+        end = len(audio)
+        if end - start > segment:
+            end = quiet_split_point(audio, start + segment, 2 * SAMPLE_RATE)
+        path = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+        wav.write(path, SAMPLE_RATE, np.asarray(audio[start:end]))
+        paths.append(path)
+        start = end
+    return paths
+
+
+def run_asr(model, audio_data):
+    """Transcribe a recording (int16 array or WAV path) with a NeMo model."""
+    segment_paths = write_asr_segments(audio_data)
+    try:
+        transcriptions = model.transcribe(audio=segment_paths, batch_size=1)
+    finally:
+        for path in segment_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    texts = []
+    for result in transcriptions if isinstance(transcriptions, list) else []:
+        if not isinstance(result, str):
+            if hasattr(result, 'text'):
+                result = result.text
+            else:
+                result = str(result)
+        if result.strip():
+            texts.append(result.strip())
+    return ' '.join(texts)
+
+
+class StreamingResampler:
+    """Block-wise polyphase resampling from the capture rate to SAMPLE_RATE.
+
+    Input is cut into blocks that start on a multiple of the decimation
+    factor. Each block is filtered together with enough neighbouring
+    samples to cover the anti-aliasing FIR, so the concatenated output
+    equals resample_poly() over the whole recording. A block is emitted
+    once the samples after it have arrived. flush() zero-pads the end,
+    as resample_poly does.
+    """
+
+    def __init__(self, rate_in, rate_out=SAMPLE_RATE, block_seconds=0.1):
+        g = math.gcd(int(rate_in), int(rate_out))
+        self.up, self.down = int(rate_out) // g, int(rate_in) // g
+        # Same Kaiser FIR resample_poly designs, computed once per stream
+        max_rate = max(self.up, self.down)
+        self.taps = None if self.passthrough else firwin(20 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+        half_width = 10 * max_rate / self.up  # filter half-length in input samples
+        self.context = self.down * math.ceil((half_width + 1) / self.down)
+        self.block = self.down * max(1, round(block_seconds * rate_in / self.down))
+        self.pending = np.zeros(self.context, dtype=np.float32)
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def _filter(self, window, count):
+        start = self.context * self.up // self.down
+        out = resample_poly(window, self.up, self.down, window=self.taps)
+        return out[start:start + count].astype(np.float32)
+
+    def process(self, samples):
+        if self.passthrough:
+            return samples
+        self.pending = np.concatenate([self.pending, samples])
+        span = 2 * self.context + self.block
+        out = []
+        while len(self.pending) >= span:
+            out.append(self._filter(self.pending[:span], self.block * self.up // self.down))
+            self.pending = self.pending[self.block:]
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    def flush(self):
+        remaining = len(self.pending) - self.context
+        if self.passthrough or remaining <= 0:
+            return np.zeros(0, dtype=np.float32)
+        window = np.concatenate([self.pending, np.zeros(self.context, dtype=np.float32)])
+        out = self._filter(window, math.ceil(remaining * self.up / self.down))
+        self.pending = np.zeros(self.context, dtype=np.float32)
+        return out
+
+
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, native_rate=True):
         self.recording = False
         self.audio_queue = queue.Queue()
         self.stream = None
-        self.audio_data = []
+        self.buffer = None
+        self.drain_thread = None
+        # Capture at the device's own rate and resample in-process instead
+        # of asking the sound server for 16 kHz
+        self.native_rate = native_rate
+        self.resampler = None
 
     def callback(self, indata, frames, time, status):
         if status:
@@ -83,28 +1541,351 @@ class AudioRecorder:
 
     def start(self):
         self.recording = True
-        self.audio_data = []
-        self.stream = sd.InputStream(
-            samplerate=SAMPLE_RATE, 
-            channels=1, 
-            callback=self.callback
-        )
+        self.buffer = CaptureBuffer(SPILL_THRESHOLD_SECONDS * SAMPLE_RATE)
+        self.stream, rate = self._open_stream()
+        self.resampler = StreamingResampler(rate)
+        self.drain_thread = threading.Thread(target=self._drain, daemon=True)
+        self.drain_thread.start()
         self.stream.start()
 
+    def _open_stream(self):
+        """Open the input at its native rate, falling back to SAMPLE_RATE."""
+        rates = [SAMPLE_RATE]
+        if self.native_rate:
+            try:
+                rates.insert(0, int(sd.query_devices(kind='input')['default_samplerate']))
+            except Exception as e:
+                logging.warning("Could not query input device rate: %s", e)
+        last_error = None
+        for rate in dict.fromkeys(rates):
+            try:
+                stream = sd.InputStream(samplerate=rate, channels=1, callback=self.callback)
+                logging.info("Capturing at %d Hz", rate)
+                return stream, rate
+            except Exception as e:
+                logging.warning("Input stream at %d Hz failed: %s", rate, e)
+                last_error = e
+        raise last_error
+
+    def _drain(self):
+        # Moves blocks off the queue while recording so RAM stays bounded;
+        # resampling here keeps the PortAudio callback minimal
+        resample_time = 0.0
+        while self.recording or not self.audio_queue.empty():
+            try:
+                block = self.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            samples = self.resampler.process(block.reshape(-1))
+            resample_time += time.perf_counter() - start
+            if len(samples):
+                self.buffer.append(self._to_int16(samples))
+        start = time.perf_counter()
+        tail = self.resampler.flush()
+        if len(tail):
+            self.buffer.append(self._to_int16(tail))
+        if not self.resampler.passthrough:
+            METRICS.record("capture.resample_flush", time.perf_counter() - start)
+            audio_seconds = self.buffer.num_samples / SAMPLE_RATE
+            if audio_seconds:
+                METRICS.record("capture.resample_per_audio_second", resample_time / audio_seconds)
+
+    @staticmethod
+    def _to_int16(block):
+        return (np.clip(block.reshape(-1), -1.0, 1.0) * 32767).astype(np.int16)
+
     def stop(self):
-        self.recording = False
+        """Stop capture and return an int16 array, a spill WAV path or None."""
         if self.stream:
             self.stream.stop()
             self.stream.close()
             self.stream = None
-        
-        while not self.audio_queue.empty():
-            self.audio_data.append(self.audio_queue.get())
-            
-        if not self.audio_data:
-            return None
-            
-        return np.concatenate(self.audio_data, axis=0)
+        self.recording = False
+        if self.drain_thread:
+            self.drain_thread.join()
+            self.drain_thread = None
+        
+        return self.buffer.finish()
+
+
+# --- Out-of-Process ASR Server ---
+class ASRServerCrashed(Exception):
+    pass
+
+
+def attach_shared_memory(name):
+    """Attach to a block owned by the UI process without adopting it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: keep the resource tracker from unlinking it at exit
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def asr_server_main(conn, model_name, vram_budget_mb, ram_budget_mb):
+    """Entry point of an ASR server process.
+
+    Requests arrive as (command, job_id, payload) tuples over ``conn`` and
+    every request gets exactly one (status, job_id, result) reply. Audio
+    comes in through shared memory and is viewed in place with NumPy.
+    """
+    registry = ASRModelRegistry(vram_budget_mb, ram_budget_mb)
+    model = None
+    try:
+        model = registry.get(model_name)
+    except Exception:
+        logging.error("ASR server failed to load %s: %s", model_name, traceback.format_exc())
+    logging.info("ASR server %d ready", os.getpid())
+    
+    while True:
+        try:
+            command, job_id, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if command == "stop":
+            break
+        try:
+            if command == "transcribe":
+                if model is None:
+                    model = registry.get(model_name)
+                kind, ref, num_samples = payload
+                if kind == "shm":
+                    shm = attach_shared_memory(ref)
+                    try:
+                        audio = np.ndarray((num_samples,), dtype=np.int16, buffer=shm.buf)
+                        result = run_asr(model, audio)
+                        del audio
+                    finally:
+                        shm.close()
+                else:
+                    result = run_asr(model, ref)
+            elif command == "load":
+                model_name = payload
+                model = registry.get(model_name)
+                result = None
+            elif command == "offload":
+                if payload == "unload":
+                    registry.unload(model_name)
+                else:
+                    registry.offload(model_name)
+                model = None
+                result = None
+            elif command == "memory":
+                result = registry.memory_snapshot()
+            else:
+                raise ValueError(f"Unknown ASR server command: {command}")
+            conn.send(("ok", job_id, result))
+        except Exception as e:
+            logging.error("ASR server error: %s", traceback.format_exc())
+            conn.send(("error", job_id, str(e)))
+
+
+class ASRProcessPool:
+    """Warm pool of ASR server processes fed through shared memory.
+
+    Keeps NeMo/CUDA off the UI process: inference no longer competes with
+    the Qt event loop for the GIL, and a crash in a server only costs a
+    restart of that process. Each server has its own lock, so requests run
+    in parallel on different servers. They go to an idle server, rotating
+    the starting point. A crashed server is respawned in the background
+    and its request is retried once on another live server.
+    """
+
+    def __init__(self, size=1, model_name=DEFAULT_ASR_MODEL, vram_budget_mb=6000,
+                 ram_budget_mb=8000, timeout=600.0):
+        self.size = max(1, size)
+        self.model_name = model_name
+        self.vram_budget_mb = vram_budget_mb
+        self.ram_budget_mb = ram_budget_mb
+        self.timeout = timeout
+        self.servers = []  # [process, connection]
+        self.loaded = True
+        self._next_job = 0
+        self._cursor = 0
+        self._lock = threading.Lock()  # guards the server list and counters
+        self._slot_locks = []  # one per server, held for a whole request
+        self._ctx = multiprocessing.get_context("spawn")
+
+    def start(self):
+        with self._lock:
+            self.start_locked()
+
+    def start_locked(self):
+        while len(self.servers) < self.size:
+            self._slot_locks.append(threading.Lock())
+            self.servers.append(self._spawn())
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=asr_server_main,
+            args=(child_conn, self.model_name, self.vram_budget_mb, self.ram_budget_mb),
+            name="darhisper-asr",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        logging.info("Started ASR server process %d", process.pid)
+        return [process, parent_conn]
+
+    def _restart(self, index):
+        """Replace server ``index``. The caller holds its slot lock."""
+        process, conn = self.servers[index]
+        conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join(timeout=5)
+        METRICS.incr("asr_server.restarts")
+        self.servers[index] = self._spawn()
+
+    def _respawn(self, index, process):
+        with self._lock:
+            if index >= len(self._slot_locks):
+                return  # pool stopped meanwhile
+        with self._slot_locks[index]:
+            if self.servers[index][0] is process:
+                self._restart(index)
+
+    def _request(self, index, command, payload):
+        """Run one request on server ``index``. The caller holds its slot lock."""
+        process, conn = self.servers[index]
+        with self._lock:
+            self._next_job += 1
+            job_id = self._next_job
+        deadline = time.monotonic() + self.timeout
+        try:
+            conn.send((command, job_id, payload))
+            while True:
+                if conn.poll(0.5):
+                    status, reply_id, result = conn.recv()
+                    if reply_id != job_id:
+                        continue  # reply to a request that already timed out
+                    if status == "error":
+                        raise RuntimeError(result)
+                    return result
+                if not process.is_alive():
+                    raise ASRServerCrashed(f"ASR server exited with code {process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise ASRServerCrashed(f"ASR server did not answer in {self.timeout:.0f}s")
+        except (EOFError, OSError, ASRServerCrashed) as e:
+            logging.error("ASR server %d failed: %s", process.pid, e)
+            # Respawn once this request releases the slot; don't make the
+            # retry wait for a cold server when a warm one is available
+            threading.Thread(target=self._respawn, args=(index, process),
+                             name="asr-respawn", daemon=True).start()
+            raise ASRServerCrashed(str(e))
+
+    def _acquire(self, exclude=None):
+        """Lock a server for one request and return its index.
+
+        Takes the first idle live server, starting one past the previous
+        pick. When every server is busy it waits for the next one in turn.
+        """
+        with self._lock:
+            if not self.servers:
+                self.start_locked()
+            count = len(self.servers)
+            first = self._cursor
+            self._cursor = (self._cursor + 1) % count
+        order = [(first + i) % count for i in range(count)]
+        candidates = [i for i in order if i != exclude] or order
+        for index in candidates:
+            if self.servers[index][0].is_alive() and self._slot_locks[index].acquire(blocking=False):
+                return index
+        live = [i for i in candidates if self.servers[i][0].is_alive()]
+        index = (live or candidates)[0]
+        self._slot_locks[index].acquire()
+        return index
+
+    def _dispatch(self, command, payload):
+        crashed = None
+        for attempt in range(2):
+            index = self._acquire(exclude=crashed)
+            try:
+                if index == crashed or not self.servers[index][0].is_alive():
+                    # No other server to fail over to: wait for a fresh one
+                    self._restart(index)
+                return self._request(index, command, payload)
+            except ASRServerCrashed:
+                if attempt:
+                    raise
+                crashed = index
+            finally:
+                self._slot_locks[index].release()
+
+    def transcribe(self, audio_data):
+        """Return the raw text for an int16 array or a spilled WAV path."""
+        shm = None
+        try:
+            if isinstance(audio_data, str):
+                payload = ("path", audio_data, 0)
+            else:
+                audio = audio_data.reshape(-1)
+                if audio.dtype != np.int16:
+                    audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+                np.ndarray(audio.shape, dtype=np.int16, buffer=shm.buf)[:] = audio
+                payload = ("shm", shm.name, len(audio))
+            start = time.monotonic()
+            text = self._dispatch("transcribe", payload)
+            METRICS.record("asr_server.transcribe", time.monotonic() - start)
+            return text
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def broadcast(self, command, payload):
+        with self._lock:
+            if not self.servers:
+                self.start_locked()
+            count = len(self.servers)
+        results = []
+        for index in range(count):
+            with self._slot_locks[index]:
+                try:
+                    results.append(self._request(index, command, payload))
+                except ASRServerCrashed:
+                    pass
+        return results
+
+    def load(self, model_name):
+        # Fresh servers load self.model_name on their own at startup
+        if self.loaded and model_name == self.model_name:
+            return
+        self.model_name = model_name
+        self.broadcast("load", model_name)
+        self.loaded = True
+
+    def offload(self, mode):
+        self.broadcast("offload", mode)
+        self.loaded = False
+
+    def memory_snapshot(self):
+        """RSS and allocated VRAM in MB summed over the servers."""
+        snapshots = self.broadcast("memory", None)
+        return sum(s[0] for s in snapshots), sum(s[1] for s in snapshots)
+
+    def stop(self):
+        with self._lock:
+            servers = list(enumerate(self.servers))
+        for index, (process, conn) in servers:
+            with self._slot_locks[index]:
+                try:
+                    conn.send(("stop", 0, None))
+                except (BrokenPipeError, OSError):
+                    pass
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.kill()
+                conn.close()
+        with self._lock:
+            self.servers = []
+            self._slot_locks = []
 
 
 # --- Transcription Worker (NeMo + Gemini) ---
@@ -115,13 +1896,36 @@ class TranscriptionWorker(QObject):
     status_update = pyqtSignal(str)
     file_progress = pyqtSignal(int, int)  # current, total chunks
     file_finished = pyqtSignal(str)
+    file_text_ready = pyqtSignal(str)  # transcript text to append, in chunk order
+    file_cancelled = pyqtSignal()
+    file_failed = pyqtSignal(str)  # file job ended with an error
+    raw_ready = pyqtSignal(str)  # optimistic paste: ASR text before Gemini
+    refined = pyqtSignal(str, str)  # optimistic paste: raw text, Gemini text
+    late_result = pyqtSignal(str, str)  # latency budget missed: raw text, Gemini text
 
     def __init__(self):
         super().__init__()
         self.asr_model = None
-        self.model_name = "nvidia/parakeet-tdt-0.6b-v3"
+        self.model_name = DEFAULT_ASR_MODEL
+        self.model_registry = ASRModelRegistry()
+        self.asr_pool = None  # ASRProcessPool when ASR runs out of process
+        self.last_activity = time.monotonic()
+        self.restore_finished = None
         self._is_loading = False
         self.gemini_client = None
+        self.optimistic_paste = False
+        self.latency_budget = LATENCY_BUDGET
+        self.local_prompts = set()  # prompt keys handled by LOCAL_PROMPT_PROCESSORS
+        self.smart_prompt_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="smart-prompt")
+        self.smart_cache = SmartPromptCache()
+        self.history = HistoryStore()
+        self.chunk_caller = ResilientCaller(max_workers=16)
+        self.rate_limiter = RateLimiter()
+        self.chunk_planner = ChunkPlanner()
+        self.upload_codec = DEFAULT_UPLOAD_CODEC
+        self.inline_max_bytes = INLINE_MAX_BYTES
+        self.decode_workers = min(4, os.cpu_count() or 1)
+        self.file_job = None  # CancelToken of the running file job
 
     def set_gemini_client(self, client):
         self.gemini_client = client
@@ -134,19 +1938,20 @@ class TranscriptionWorker(QObject):
         self.status_update.emit("Cargando modelo NVIDIA Parakeet (esto puede tardar)...")
         
         try:
-            import nemo.collections.asr as nemo_asr
-            import torch
-            
-            logging.info("Imported NeMo. Loading model...")
+            logging.info("Loading model %s...", self.model_name)
             
-            # Load model to GPU
-            self.asr_model = nemo_asr.models.EncDecRNNTBPEModel.from_pretrained(model_name=self.model_name)
-            
-            if torch.cuda.is_available():
-                self.asr_model = self.asr_model.to("cuda")
-                logging.info("Model moved to CUDA")
+            if self.asr_pool is not None:
+                # The pool stands in for the model; servers load it themselves
+                self.asr_pool.load(self.model_name)
+                self.asr_model = self.asr_pool
             else:
-                logging.warning("CUDA not available! Model will be slow.")
+                import torch
+                
+                # Load model to GPU
+                self.asr_model = self.model_registry.get(self.model_name)
+                
+                if not torch.cuda.is_available():
+                    logging.warning("CUDA not available! Model will be slow.")
 
             self.model_loaded.emit(True)
             self.status_update.emit("Modelo listo")
@@ -157,83 +1962,208 @@ class TranscriptionWorker(QObject):
         finally:
             self._is_loading = False
 
-    def transcribe(self, audio_data, gemini_key, prompt_key):
+    def idle_offload(self, mode, idle_seconds):
+        """Release the live model after a quiet period ("cpu" or "unload")."""
+        if self.asr_model is None or time.monotonic() - self.last_activity < idle_seconds:
+            return
+        memory = self.asr_pool or self.model_registry
+        rss_before, vram_before = memory.memory_snapshot()
+        # Drop our reference first so the registry's gc/empty_cache can free it
+        self.asr_model = None
+        if self.asr_pool is not None:
+            self.asr_pool.offload(mode)
+        elif mode == "unload":
+            self.model_registry.unload(self.model_name)
+        else:
+            self.model_registry.offload(self.model_name)
+        rss_after, vram_after = memory.memory_snapshot()
+        logging.info(
+            "Idle offload (%s): RSS %.0f -> %.0f MB, VRAM %.0f -> %.0f MB",
+            mode, rss_before, rss_after, vram_before, vram_after
+        )
+
+    def prewarm(self):
+        """Restore an offloaded model while the user is still speaking."""
+        self.last_activity = time.monotonic()
+        if self.asr_model is not None:
+            return
+        start = time.monotonic()
+        self.load_model()
+        self.restore_finished = time.monotonic()
+        METRICS.record("asr_model.idle_restore", self.restore_finished - start)
+        rss, vram = (self.asr_pool or self.model_registry).memory_snapshot()
+        logging.info("Model restored: RSS %.0f MB, VRAM %.0f MB", rss, vram)
+
+    def set_model(self, name):
+        """Switch the live ASR model; instant when the model is resident."""
+        if name == self.model_name and self.asr_model is not None:
+            return
+        self.model_name = name
+        if self.asr_pool is not None:
+            self.asr_pool.load(name)
+            return
+        if self.model_registry.is_resident(name):
+            self.asr_model = self.model_registry.get(name)
+            logging.info("Switched to resident ASR model %s", name)
+            return
+        self.asr_model = None
+        self.load_model()
+
+    @profiled("dictation")
+    def transcribe(self, audio_data, gemini_key, prompt_key, stop_time=None):
+        """``stop_time`` is the monotonic time this dictation's key was released."""
+        self.last_activity = time.monotonic()
+        if self.restore_finished is not None and stop_time is not None:
+            # Part of the restore not hidden behind the user's speech
+            METRICS.record("asr_model.restore_exposed", max(0.0, self.restore_finished - stop_time))
+            self.restore_finished = None
         if self.asr_model is None:
             self.load_model()
             if self.asr_model is None:
+                if isinstance(audio_data, str) and os.path.exists(audio_data):
+                    os.remove(audio_data)
                 return
 
+        timings = {}
+        job_start = time.monotonic()
         try:
-            # 1. Save temp wav for NeMo
-            temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
-            
-            # Normalize and save
-            audio_flat = audio_data.flatten()
-            audio_int16 = (audio_flat * 32767).astype(np.int16)
-            wav.write(temp_wav, SAMPLE_RATE, audio_int16)
+            if isinstance(audio_data, str):
+                audio_seconds = wav_duration(audio_data)[0]
+            else:
+                audio_seconds = audio_data.size / SAMPLE_RATE
             
-            # 2. Transcribe with NeMo
+            # 1-2. Transcribe with NeMo, in-process or on the ASR server pool
             self.status_update.emit("Transcribiendo con Parakeet GPU...")
             logging.info("Starting transcription...")
             
-            transcriptions = self.asr_model.transcribe(audio=[temp_wav])
-            
-            if isinstance(transcriptions, list) and len(transcriptions) > 0:
-                raw_text = transcriptions[0]
-                if not isinstance(raw_text, str):
-                    if hasattr(raw_text, 'text'):
-                        raw_text = raw_text.text
-                    else:
-                        raw_text = str(raw_text)
+            if self.asr_pool is not None:
+                raw_text = self.asr_pool.transcribe(audio_data)
             else:
-                raw_text = ""
+                raw_text = run_asr(self.asr_model, audio_data)
+            timings["asr"] = time.monotonic() - job_start
 
-            logging.info(f"Raw transcription: {raw_text}")
-            
-            try:
-                os.remove(temp_wav)
-            except:
-                pass
+            logging.debug("Raw transcription: %s", raw_text)
 
             if not raw_text.strip():
                 self.finished.emit("")
                 return
 
-            # 3. Gemini Processing
-            if gemini_key and prompt_key in SMART_PROMPTS:
+            # 3. Local fast path or Gemini Processing
+            stage_start = time.monotonic()
+            model_label = self.model_name
+            optimistic = False
+            if prompt_key in self.local_prompts and prompt_key in LOCAL_PROMPT_PROCESSORS:
+                start = time.perf_counter()
+                final_text = LOCAL_PROMPT_PROCESSORS[prompt_key](raw_text)
+                METRICS.record("smart_prompt.local", time.perf_counter() - start)
+                model_label += "+local"
+            elif gemini_key and prompt_key in SMART_PROMPTS:
+                model_label += f"+{SMART_PROMPT_MODEL}"
+                optimistic = self.optimistic_paste
+                if optimistic:
+                    # Paste the Parakeet text now, swap it once Gemini answers
+                    self.raw_ready.emit(raw_text)
                 self.status_update.emit("Procesando con Gemini AI...")
-                final_text = self.process_with_gemini(raw_text, gemini_key, prompt_key)
+                if optimistic:
+                    final_text = self.process_with_gemini(raw_text, gemini_key, prompt_key)
+                else:
+                    final_text = self.process_within_budget(raw_text, gemini_key, prompt_key, stop_time)
             else:
                 final_text = raw_text
+            timings["smart_prompt"] = time.monotonic() - stage_start
+            timings["total"] = time.monotonic() - job_start
 
-            self.finished.emit(final_text)
+            if optimistic:
+                self.refined.emit(raw_text, final_text)
+            else:
+                self.finished.emit(final_text)
+            self.history.add("dictation", prompt_key, model_label, audio_seconds, timings, final_text)
 
         except Exception as e:
             logging.error(f"Transcription error: {traceback.format_exc()}")
             self.error.emit(str(e))
+        finally:
+            if isinstance(audio_data, str) and os.path.exists(audio_data):
+                os.remove(audio_data)
+
+    def process_within_budget(self, raw_text, api_key, prompt_key, stop_time=None):
+        """Run the Smart Prompt step within what is left of the latency budget,
+        counted from ``stop_time`` (now if unknown).
+
+        If Gemini does not answer in time the raw text is returned, and the
+        late result is handed to the app through ``late_result``.
+        """
+        if not self.latency_budget:
+            return self.process_with_gemini(raw_text, api_key, prompt_key)
+        
+        since = stop_time if stop_time is not None else time.monotonic()
+        remaining = self.latency_budget - (time.monotonic() - since)
+        future = self.smart_prompt_executor.submit(self.process_with_gemini, raw_text, api_key, prompt_key)
+        try:
+            result = future.result(timeout=max(0.0, remaining))
+            METRICS.incr("latency_budget.met")
+            return result
+        except FuturesTimeoutError:
+            METRICS.incr("latency_budget.missed")
+            logging.info("Smart Prompt over the %.1fs budget, pasting raw text", self.latency_budget)
+            future.add_done_callback(lambda f: self._on_late_result(raw_text, f))
+            return raw_text
+
+    def _on_late_result(self, raw_text, future):
+        text = future.result()
+        if text and text != raw_text:
+            self.late_result.emit(raw_text, text)
 
     def process_with_gemini(self, text, api_key, prompt_key):
+        cached = self.smart_cache.get(text, prompt_key, SMART_PROMPT_MODEL)
+        if cached is not None:
+            logging.info("Smart Prompt cache hit")
+            return cached
+        
         try:
+            start = time.monotonic()
             client = genai.Client(api_key=api_key)
-            prompt = SMART_PROMPTS[prompt_key]
+            contents = f"{SMART_PROMPTS[prompt_key]}\n\nTexto a procesar:\n{text}"
             
-            response = client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=f"{prompt}\n\nTexto a procesar:\n{text}"
-            )
-            return response.text.strip()
+            for attempt in range(2):
+                self.rate_limiter.acquire("live", estimate_text_tokens(contents), live=True)
+                try:
+                    response = client.models.generate_content(
+                        model=SMART_PROMPT_MODEL,
+                        contents=contents
+                    )
+                    break
+                except Exception as e:
+                    self.rate_limiter.note_error(e)
+                    # One more try once the limiter has waited out the 429
+                    if attempt or not is_rate_limited(e):
+                        raise
+                    METRICS.incr("ratelimit.live_retries")
+            result = response.text.strip()
+            METRICS.record("smart_prompt.gemini", time.monotonic() - start)
         except Exception as e:
             logging.error(f"Gemini error: {e}")
             return text
+        
+        if result:
+            self.smart_cache.put(text, prompt_key, SMART_PROMPT_MODEL, result)
+        return result
 
+    @profiled("file")
     def transcribe_file(self, file_path, gemini_key, prompt_key, file_model):
         """Transcribe an audio file using Gemini API"""
         logging.info(f"Starting file transcription: {file_path}")
         
+        journal = ChunkJournal.for_job(file_path, prompt_key, file_model)
+        if journal.chunks:
+            logging.info("Resuming job %s: %d chunks already done", journal.path, len(journal.chunks))
+        
+        cancel = self.file_job = CancelToken()
         temp_wav = None
+        ChunkJournal.active.add(journal.path)
         try:
             if not gemini_key:
-                self.error.emit("API Key de Gemini no configurada")
+                self.file_failed.emit("API Key de Gemini no configurada")
                 return
             
             # Initialize Gemini client
@@ -241,52 +2171,97 @@ class TranscriptionWorker(QObject):
                 try:
                     self.gemini_client = genai.Client(api_key=gemini_key)
                 except Exception as e:
-                    self.error.emit(f"Error inicializando Gemini: {str(e)}")
+                    self.file_failed.emit(f"Error inicializando Gemini: {str(e)}")
                     return
             
-            # Convert audio to WAV
+            # Decode ranges of the original file in parallel when it can be
+            # probed; otherwise convert the whole file to WAV first
             self.status_update.emit("Convirtiendo audio...")
-            temp_wav = self.convert_audio_to_wav(file_path)
-            
-            if temp_wav is None:
-                self.error.emit("Error convirtiendo audio")
-                return
+            job_start = time.monotonic()
+            throttled_before = METRICS.counters.get("ratelimit.wait_seconds.chunk", 0)
+            duration = probe_duration(file_path) if self.decode_workers > 1 else None
+            if duration:
+                source = FfmpegRangeSource(file_path, duration, self.decode_workers, cancel=cancel)
+                bytes_per_second = SAMPLE_RATE * 2
+            else:
+                temp_wav = self.convert_audio_to_wav(file_path, cancel)
+                
+                if temp_wav is None:
+                    self.file_failed.emit("Error convirtiendo audio")
+                    return
+                source = WavSource(temp_wav)
+                duration, bytes_per_second = wav_duration(temp_wav)
             
             # Transcribe with Gemini chunks
+            cancel.check()
             self.status_update.emit("Transcribiendo con Gemini...")
-            text = self.transcribe_with_gemini_chunks(temp_wav, gemini_key, prompt_key, file_model)
+            bytes_per_second = UPLOAD_CODECS[self.upload_codec]["bytes_per_second"] or bytes_per_second
+            if journal.header:
+                # Resumed jobs must keep their original chunk boundaries
+                chunk_duration = journal.header["chunk_duration"]
+            else:
+                chunk_duration = self.chunk_planner.plan(duration, bytes_per_second)
+            journal.start(file_path, prompt_key, file_model, chunk_duration)
+            text = self.transcribe_with_gemini_chunks(
+                source, gemini_key, prompt_key, file_model,
+                chunk_duration=chunk_duration, journal=journal, cancel=cancel
+            )
+            journal.finish()
+            wall = time.monotonic() - job_start
+            if text:
+                self.history.add(
+                    "file", prompt_key, file_model, duration,
+                    {"total": wall, "chunk_duration": chunk_duration}, text
+                )
+            METRICS.record("file_job.wall", wall)
+            logging.info(
+                "File job done: %.0fs audio, codec=%s, %ss chunks, parallelism=%d, "
+                "decode_workers=%d, wall=%.1fs, throttled=%.1fs",
+                duration, self.upload_codec, chunk_duration, self.chunk_planner.parallelism,
+                self.decode_workers, wall,
+                METRICS.counters.get('ratelimit.wait_seconds.chunk', 0) - throttled_before
+            )
             
             if text:
                 self.file_finished.emit(text)
             else:
-                self.error.emit("No se detectó texto en el audio")
+                self.file_failed.emit("No se detectó texto en el audio")
                 
+        except JobCancelled:
+            # A cancelled job was not wanted: drop its checkpoints too
+            logging.info("File job cancelled: %s", file_path)
+            journal.finish()
+            self.file_cancelled.emit()
         except Exception as e:
             logging.error(f"File transcription error: {traceback.format_exc()}")
-            self.error.emit(str(e))
+            self.file_failed.emit(str(e))
         finally:
+            ChunkJournal.active.discard(journal.path)
             if temp_wav and os.path.exists(temp_wav):
                 try:
                     os.remove(temp_wav)
                 except:
                     pass
-
-    def convert_audio_to_wav(self, input_path):
+            if cancel.cancelled_at is not None:
+                METRICS.record("file_job.cancel_to_idle", time.monotonic() - cancel.cancelled_at)
+            if self.file_job is cancel:
+                self.file_job = None
+
+    def cancel_file_job(self):
+        """Cancel the running file job. Safe to call from any thread."""
+        job = self.file_job
+        if job is not None:
+            logging.info("Cancelling file job")
+            job.cancel()
+
+    def convert_audio_to_wav(self, input_path, cancel=None):
         """Convert audio file to WAV format using ffmpeg"""
         logging.info(f"Converting audio file: {input_path}")
         
         temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
         
         try:
-            ffmpeg_path = shutil.which("ffmpeg")
-            if not ffmpeg_path:
-                for p in ["/usr/bin/ffmpeg", "/usr/local/bin/ffmpeg"]:
-                    if os.path.exists(p):
-                        ffmpeg_path = p
-                        break
-            
-            if not ffmpeg_path:
-                raise Exception("ffmpeg no encontrado. Instálalo con: sudo apt install ffmpeg")
+            ffmpeg_path = find_ffmpeg()
             
             cmd = [
                 ffmpeg_path,
@@ -299,7 +2274,8 @@ class TranscriptionWorker(QObject):
             ]
             
             logging.info(f"Running ffmpeg: {cmd}")
-            result = subprocess.run(
+            run = cancel.run_process if cancel is not None else subprocess.run
+            result = run(
                 cmd,
                 capture_output=True,
                 encoding='utf-8',
@@ -318,73 +2294,245 @@ class TranscriptionWorker(QObject):
             return temp_wav
             
         except subprocess.TimeoutExpired:
+            if os.path.exists(temp_wav):
+                os.remove(temp_wav)
             raise Exception("Conversión de audio expiró (archivo muy grande)")
+        except JobCancelled:
+            if os.path.exists(temp_wav):
+                os.remove(temp_wav)
+            raise
         except Exception as e:
             logging.error(f"Error converting audio: {e}")
             if os.path.exists(temp_wav):
                 os.remove(temp_wav)
             raise e
 
-    def transcribe_with_gemini_chunks(self, wav_path, api_key, prompt_key, model_name, chunk_duration=300):
-        """Transcribe long audio using Gemini API in chunks"""
+    def transcribe_with_gemini_chunks(self, source, api_key, prompt_key, model_name, chunk_duration=300,
+                                      journal=None, cancel=None):
+        """Transcribe long audio using Gemini API in chunks.
+
+        ``source`` is a WAV path or a chunk source (WavSource,
+        FfmpegRangeSource); chunk audio is read on the chunk pool. Chunks
+        already recorded in ``journal`` are reused instead of being uploaded
+        again, and every newly finished chunk is checkpointed.
+
+        When ``cancel`` fires, queued chunks are dropped and JobCancelled is
+        raised without waiting for requests already in flight; those finish
+        in the background and their uploads are deleted afterwards.
+        """
         logging.info(f"Transcribing with Gemini using {chunk_duration}s chunks")
         
         try:
-            sr, audio = wav.read(wav_path)
+            if isinstance(source, str):
+                source = WavSource(source)
+            sr = source.sr
             
             chunk_samples = int(chunk_duration * sr)
-            total_samples = len(audio)
+            total_samples = source.total_samples
             num_chunks = math.ceil(total_samples / chunk_samples)
             
             logging.info(f"Audio duration: {total_samples/sr:.2f}s, Chunks: {num_chunks}")
             
-            full_transcription = []
             transcription_prompt = SMART_PROMPTS.get(prompt_key, SMART_PROMPTS["Transcripción Literal"])
+            results = {}
+            pending = []
             
             for i in range(num_chunks):
-                start_idx = i * chunk_samples
-                end_idx = min((i + 1) * chunk_samples, total_samples)
-                chunk_audio = audio[start_idx:end_idx]
-                
-                if len(chunk_audio) < sr:
-                    self.file_progress.emit(i + 1, num_chunks)
-                    continue
-                
-                logging.info(f"Processing chunk {i+1}/{num_chunks}")
-                self.file_progress.emit(i + 1, num_chunks)
-                
-                chunk_temp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
-                wav.write(chunk_temp, sr, chunk_audio)
-                
-                try:
-                    logging.info(f"Uploading chunk {i+1}")
-                    myfile = self.gemini_client.files.upload(file=chunk_temp)
-                    
-                    logging.info(f"Transcribing chunk {i+1}")
-                    response = self.gemini_client.models.generate_content(
-                        model=model_name,
-                        contents=[myfile, transcription_prompt]
+                if journal is not None and i in journal.chunks:
+                    results[i] = journal.chunks[i]
+                elif min((i + 1) * chunk_samples, total_samples) - i * chunk_samples < sr:
+                    results[i] = ""
+                else:
+                    pending.append(i)
+            
+            next_emit = 0
+            emitted_any = False
+            
+            def emit_ready():
+                # Stream the finished prefix so the interface can render it
+                # before the slower chunks after it come back
+                nonlocal next_emit, emitted_any
+                parts = []
+                while next_emit in results:
+                    if results[next_emit]:
+                        parts.append(results[next_emit])
+                    next_emit += 1
+                if parts:
+                    self.file_text_ready.emit((' ' if emitted_any else '') + ' '.join(parts))
+                    emitted_any = True
+            
+            done = len(results)
+            self.file_progress.emit(done, num_chunks)
+            emit_ready()
+            
+            uploaded_files = []
+            attempts = []  # every Gemini attempt future, including losing hedges
+            pool = ThreadPoolExecutor(max_workers=self.chunk_planner.parallelism, thread_name_prefix="chunk")
+            try:
+                futures = {}
+                for i in pending:
+                    start_idx = i * chunk_samples
+                    end_idx = min((i + 1) * chunk_samples, total_samples)
+                    future = pool.submit(
+                        self.transcribe_chunk, source, start_idx, end_idx, i, num_chunks,
+                        model_name, transcription_prompt, uploaded_files, cancel, attempts
                     )
-                    
-                    chunk_text = response.text.strip()
-                    if chunk_text:
-                        full_transcription.append(chunk_text)
-                        logging.info(f"Chunk {i+1}: {chunk_text[:100]}...")
-                        
-                finally:
-                    if os.path.exists(chunk_temp):
-                        os.remove(chunk_temp)
+                    futures[future] = (i, start_idx, end_idx)
+                
+                not_done = set(futures)
+                while not_done:
+                    finished, not_done = wait(not_done, timeout=0.25, return_when=FIRST_COMPLETED)
+                    if cancel is not None:
+                        cancel.check()
+                    for future in finished:
+                        i, start_idx, end_idx = futures[future]
+                        chunk_text = future.result()
+                        results[i] = chunk_text
+                        if journal is not None:
+                            journal.record_chunk(i, start_idx / sr, end_idx / sr, chunk_text)
+                        done += 1
+                        self.file_progress.emit(done, num_chunks)
+                        emit_ready()
+            finally:
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    threading.Thread(
+                        target=self.release_cancelled_chunks, args=(pool, uploaded_files, attempts, cancel),
+                        name="chunk-release", daemon=True
+                    ).start()
+                else:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    self.release_uploads(uploaded_files, attempts)
             
+            full_transcription = [results[i] for i in range(num_chunks) if results.get(i)]
             combined_text = ' '.join(full_transcription).strip()
             logging.info(f"Combined transcription: {len(combined_text)} chars")
             
             return combined_text
             
+        except JobCancelled:
+            raise
         except Exception as e:
             logging.error(f"Gemini chunks error: {e}")
             traceback.print_exc()
             raise e
 
+    def transcribe_chunk(self, source, start_idx, end_idx, index, num_chunks, model_name,
+                         transcription_prompt, uploaded_files, cancel=None, attempts=None):
+        """Send one chunk and return its text. Runs on the chunk pool.
+
+        Chunks up to ``inline_max_bytes`` travel inline in the request; larger
+        ones go through the Files API and are appended to ``uploaded_files``
+        so the job can delete them when it ends. Attempt futures are added to
+        ``attempts``.
+        """
+        if cancel is not None:
+            cancel.check()
+        logging.info("Processing chunk %d/%d", index + 1, num_chunks)
+        sr = source.sr
+        chunk_audio = source.read(start_idx, end_idx)
+        chunk_temp = encode_audio_chunk(chunk_audio, sr, self.upload_codec, cancel)
+        size = os.path.getsize(chunk_temp)
+        METRICS.incr(f"upload.bytes.{self.upload_codec}", size)
+        strategy = "inline" if size <= self.inline_max_bytes else "files"
+        tokens = int(len(chunk_audio) / sr * AUDIO_TOKENS_PER_SECOND) + estimate_text_tokens(transcription_prompt)
+        # Big chunks on a slow uplink need longer than the base deadline;
+        # timing them out early only starts a duplicate upload
+        deadline = self.chunk_caller.deadline + size / UPLOAD_MIN_BYTES_PER_SECOND
+        
+        def send_chunk(hedge):
+            if cancel is not None:
+                cancel.check()
+            # Hedges are optional: send one only if background headroom is
+            # free right now, never by queueing for quota
+            if hedge and not self.rate_limiter.try_acquire("hedge", tokens):
+                raise HedgeSkipped()
+            if strategy == "inline":
+                with open(chunk_temp, 'rb') as f:
+                    audio_part = genai_types.Part.from_bytes(
+                        data=f.read(), mime_type=UPLOAD_CODECS[self.upload_codec]["mime"]
+                    )
+                METRICS.incr("gemini.requests.inline")
+            else:
+                logging.debug("Uploading chunk %d", index + 1)
+                audio_part = self.gemini_client.files.upload(file=chunk_temp)
+                uploaded_files.append(audio_part)
+                METRICS.incr("gemini.requests.files", 2)
+            
+            logging.debug("Transcribing chunk %d (%s)", index + 1, strategy)
+            if not hedge:
+                self.rate_limiter.acquire("chunk", tokens, cancel=cancel)
+            try:
+                return self.gemini_client.models.generate_content(
+                    model=model_name,
+                    contents=[audio_part, transcription_prompt]
+                )
+            except Exception as e:
+                self.rate_limiter.note_error(e)
+                raise
+        
+        try:
+            start = time.monotonic()
+            response = self.chunk_caller.call("chunk", send_chunk, attempts, deadline)
+            elapsed = time.monotonic() - start
+            self.chunk_planner.observe(len(chunk_audio) / sr, elapsed)
+            METRICS.record(f"chunk.{strategy}", elapsed)
+            
+            chunk_text = response.text.strip()
+            if chunk_text and logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Chunk %d: %s...", index + 1, chunk_text[:100])
+            return chunk_text
+        finally:
+            if os.path.exists(chunk_temp):
+                os.remove(chunk_temp)
+
+    def release_cancelled_chunks(self, pool, uploaded_files, attempts, cancel):
+        """Wait out the requests of a cancelled job, then delete its uploads.
+
+        Both the chunk threads and every Gemini attempt they started (which
+        run on the chunk caller's executor and can still be mid-upload) must
+        have finished before the uploads are deleted and the job counts as
+        freed.
+        """
+        pool.shutdown(wait=True)
+        # No chunk thread is left to start new attempts
+        wait(list(attempts))
+        self.delete_uploaded_files(uploaded_files)
+        freed = time.monotonic() - cancel.cancelled_at
+        METRICS.record("file_job.cancel_to_freed", freed)
+        logging.info("Cancelled job released its requests and uploads %.1fs after cancel", freed)
+
+    def release_uploads(self, uploaded_files, attempts):
+        """Delete the job's uploads now, and again whenever an attempt that
+        outlived its chunk (a losing hedge, a call abandoned at its deadline)
+        finishes, so uploads that land after the job ended are not leaked.
+        """
+        self.delete_uploaded_files(uploaded_files)
+        for future in list(attempts):
+            if not future.done():
+                future.add_done_callback(lambda _: self.delete_uploaded_files(uploaded_files))
+
+    def delete_uploaded_files(self, uploaded_files):
+        """Remove this job's Files API uploads from the service.
+
+        Deleted entries are popped from the list, so calling this again (from
+        a late attempt's callback) only deletes the newer uploads.
+        """
+        deleted = 0
+        while True:
+            try:
+                uploaded = uploaded_files.pop()
+            except IndexError:
+                break
+            try:
+                self.gemini_client.files.delete(name=uploaded.name)
+                METRICS.incr("gemini.requests.files_deleted")
+                deleted += 1
+            except Exception as e:
+                logging.warning("Could not delete uploaded file %s: %s", getattr(uploaded, "name", uploaded), e)
+        if deleted:
+            logging.info("Deleted %d uploaded files", deleted)
+
 
 # --- Overlay Window ---
 class VoiceWaveOverlay(QWidget):
@@ -509,6 +2657,14 @@ class DarhisperInterface(QMainWindow):
         super().__init__()
         self.app = app
         self.selected_file = None
+        self.job_running = False
+        # File transcript text received but not yet appended to the view
+        self.pending_text = []
+        self.streamed_chars = 0
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(RENDER_INTERVAL_MS)
+        self.render_timer.timeout.connect(self.flush_transcript)
         self.setup_ui()
         
     def setup_ui(self):
@@ -604,7 +2760,7 @@ class DarhisperInterface(QMainWindow):
                     stop:0 #00ccff, stop:1 #8844ff);
                 border-radius: 4px;
             }
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: rgba(0,0,0,0.3);
                 color: white;
                 border: 1px solid rgba(255,255,255,0.1);
@@ -612,6 +2768,17 @@ class DarhisperInterface(QMainWindow):
                 padding: 10px;
                 font-size: 13px;
             }
+            QListWidget {
+                background-color: rgba(0,0,0,0.3);
+                color: white;
+                border: 1px solid rgba(255,255,255,0.1);
+                border-radius: 8px;
+                padding: 6px;
+                font-size: 12px;
+            }
+            QListWidget::item:selected {
+                background-color: #0088cc;
+            }
             QLineEdit {
                 background-color: rgba(0,0,0,0.3);
                 color: rgba(255,255,255,0.8);
@@ -688,6 +2855,15 @@ class DarhisperInterface(QMainWindow):
         self.transcribe_btn.setMinimumHeight(45)
         file_layout.addWidget(self.transcribe_btn)
         
+        self.cancel_btn = QPushButton("⏹️ Cancelar")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_transcription)
+        file_layout.addWidget(self.cancel_btn)
+        
+        self.resume_btn = QPushButton("⏯️ Continuar trabajos interrumpidos...")
+        self.resume_btn.clicked.connect(self.resume_transcription)
+        file_layout.addWidget(self.resume_btn)
+        
         layout.addWidget(file_group)
         
         # --- Progress Section ---
@@ -718,8 +2894,11 @@ class DarhisperInterface(QMainWindow):
         mic_col = QVBoxLayout()
         mic_col.addWidget(QLabel("Modelo Micrófono:"))
         self.live_model_combo = QComboBox()
-        self.live_model_combo.addItems(["nvidia/parakeet-tdt-0.6b-v3"])
-        self.live_model_combo.setEnabled(False)
+        for name, label in ASR_MODELS.items():
+            self.live_model_combo.addItem(label, name)
+        current_index = self.live_model_combo.findData(self.app.live_model)
+        self.live_model_combo.setCurrentIndex(current_index if current_index != -1 else 0)
+        self.live_model_combo.currentIndexChanged.connect(self.change_live_model)
         mic_col.addWidget(self.live_model_combo)
         models_row.addLayout(mic_col)
         
@@ -761,6 +2940,18 @@ class DarhisperInterface(QMainWindow):
         
         config_layout.addLayout(options_row)
         
+        # Row 3: Upload format for file transcription
+        codec_col = QVBoxLayout()
+        codec_col.addWidget(QLabel("Formato de subida (archivos):"))
+        self.codec_combo = QComboBox()
+        for codec, spec in UPLOAD_CODECS.items():
+            self.codec_combo.addItem(spec["label"], codec)
+        current_index = self.codec_combo.findData(self.app.upload_codec)
+        self.codec_combo.setCurrentIndex(current_index if current_index != -1 else 0)
+        self.codec_combo.currentIndexChanged.connect(self.change_upload_codec)
+        codec_col.addWidget(self.codec_combo)
+        config_layout.addLayout(codec_col)
+        
         # API Key Button
         self.api_key_btn = QPushButton("🔐 Configurar API Key de Gemini...")
         self.api_key_btn.clicked.connect(self.edit_api_key)
@@ -773,7 +2964,9 @@ class DarhisperInterface(QMainWindow):
         output_group.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         output_layout = QVBoxLayout(output_group)
         
-        self.transcription_text = QTextEdit()
+        # QPlainTextEdit only lays out the visible blocks, so multi-hour
+        # transcripts stay responsive
+        self.transcription_text = QPlainTextEdit()
         self.transcription_text.setPlaceholderText("La transcripción aparecerá aquí...")
         self.transcription_text.setMinimumHeight(150)
         self.transcription_text.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
@@ -798,6 +2991,48 @@ class DarhisperInterface(QMainWindow):
         output_layout.addLayout(btn_row)
         layout.addWidget(output_group, 1)
         
+        # --- History Section ---
+        history_group = QGroupBox("HISTORIAL")
+        history_layout = QVBoxLayout(history_group)
+        
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("Buscar en dictados y transcripciones...")
+        self.history_search.textChanged.connect(lambda _: self.history_timer.start())
+        history_layout.addWidget(self.history_search)
+        
+        # Debounce keystrokes so each search runs once typing pauses
+        self.history_timer = QTimer(self)
+        self.history_timer.setSingleShot(True)
+        self.history_timer.setInterval(150)
+        self.history_timer.timeout.connect(self.refresh_history)
+        
+        self.history_list = QListWidget()
+        self.history_list.setMinimumHeight(150)
+        self.history_list.itemDoubleClicked.connect(self.open_history_entry)
+        history_layout.addWidget(self.history_list)
+        
+        layout.addWidget(history_group)
+        self.refresh_history()
+        
+    def refresh_history(self):
+        self.history_list.clear()
+        try:
+            rows = self.app.worker.history.search(self.history_search.text())
+        except sqlite3.Error as e:
+            logging.error("History search failed: %s", e)
+            return
+        for _id, created, kind, mode, model, duration, timings, text in rows:
+            icon = "🎙️" if kind == "dictation" else "📁"
+            stamp = time.strftime("%d/%m %H:%M", time.localtime(created))
+            snippet = " ".join(text.split())[:120]
+            item = QListWidgetItem(f"{icon} {stamp} · {mode} · {snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, text)
+            item.setToolTip(f"{model} · {duration or 0:.1f}s audio")
+            self.history_list.addItem(item)
+            
+    def open_history_entry(self, item):
+        self.transcription_text.setPlainText(item.data(Qt.ItemDataRole.UserRole))
+        
     def select_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Seleccionar archivo de audio", "",
@@ -807,41 +3042,131 @@ class DarhisperInterface(QMainWindow):
             self.selected_file = file_path
             self.file_path_label.setText(os.path.basename(file_path))
             self.file_path_label.setStyleSheet("color: rgba(255,255,255,0.9); font-family: monospace;")
-            self.transcribe_btn.setEnabled(True)
+            self.transcribe_btn.setEnabled(not self.job_running)
             
     def start_transcription(self):
-        if not self.selected_file:
+        if not self.selected_file or self.job_running:
             return
+        self.run_file_job(self.selected_file, self.app.active_prompt, self.app.file_transcription_model)
         
+    def resume_transcription(self):
+        if self.job_running:
+            return
+        journals = ChunkJournal.list_interrupted()
+        if not journals:
+            QMessageBox.information(self, "Darhisper", "No hay trabajos interrumpidos")
+            return
+        
+        labels = [
+            f"{os.path.basename(j.header['file'])} — {j.header['prompt_key']} ({len(j.chunks)} fragmentos hechos)"
+            for j in journals
+        ]
+        label, ok = QInputDialog.getItem(self, "Continuar trabajo", "Trabajo interrumpido:", labels, 0, False)
+        if not ok:
+            return
+        header = journals[labels.index(label)].header
+        self.selected_file = header["file"]
+        self.file_path_label.setText(os.path.basename(header["file"]))
+        self.run_file_job(header["file"], header["prompt_key"], header["model"])
+        
+    def run_file_job(self, file_path, prompt_key, model):
+        # One job at a time: a second one would take over the cancel token and the view
+        if self.job_running:
+            return
+        self.job_running = True
+        self.transcription_text.clear()
+        self.pending_text = []
+        self.streamed_chars = 0
         self.progress_bar.setValue(0)
         self.progress_label.setText("0%")
         self.transcribe_btn.setEnabled(False)
+        self.resume_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
         
         # Start transcription in worker thread
         threading.Thread(
             target=self.app.worker.transcribe_file,
-            args=(self.selected_file, self.app.gemini_key, self.app.active_prompt, self.app.file_transcription_model),
+            args=(file_path, self.app.gemini_key, prompt_key, model),
             daemon=True
         ).start()
         
+    def cancel_transcription(self):
+        self.cancel_btn.setEnabled(False)
+        self.progress_label.setText("Cancelando...")
+        self.app.worker.cancel_file_job()
+        
+    def on_job_ended(self):
+        self.job_running = False
+        self.streamed_chars = 0
+        self.transcribe_btn.setEnabled(self.selected_file is not None)
+        self.resume_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        
+    def on_transcription_cancelled(self):
+        self.on_job_ended()
+        self.progress_label.setText("Cancelado")
+        
+    def on_transcription_failed(self):
+        self.on_job_ended()
+        self.progress_label.setText("Error")
+        
     def update_progress(self, current, total):
         if total > 0:
             percentage = int((current / total) * 100)
             self.progress_bar.setValue(percentage)
             self.progress_label.setText(f"{percentage}%")
             
+    def append_transcript(self, text):
+        self.pending_text.append(text)
+        self.streamed_chars += len(text)
+        if not self.render_timer.isActive():
+            self.render_timer.start()
+            
+    def flush_transcript(self):
+        """Append at most RENDER_BATCH_CHARS of pending text per timer tick."""
+        if not self.pending_text:
+            return
+        text = ''.join(self.pending_text)
+        batch, rest = text[:RENDER_BATCH_CHARS], text[RENDER_BATCH_CHARS:]
+        self.pending_text = [rest] if rest else []
+        
+        start = time.perf_counter()
+        cursor = QTextCursor(self.transcription_text.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(batch)
+        METRICS.record("gui.transcript_append", time.perf_counter() - start)
+        if self.pending_text:
+            self.render_timer.start()
+            
     def on_transcription_complete(self, text):
-        self.transcription_text.setText(text)
-        self.transcribe_btn.setEnabled(True)
+        if self.streamed_chars != len(text):
+            # Nothing (or something different) was streamed: show it whole
+            self.pending_text = []
+            self.transcription_text.setPlainText(text)
+        self.on_job_ended()
         self.progress_bar.setValue(100)
         self.progress_label.setText("100%")
         
+    def change_live_model(self, index):
+        model = self.live_model_combo.itemData(index)
+        self.app.live_model = model
+        self.app.config["live_model"] = model
+        self.app.save_config()
+        self.app.request_model.emit(model)
+        
     def change_file_model(self, index):
         model = self.file_model_combo.itemData(index) or self.file_model_combo.itemText(index)
         self.app.file_transcription_model = model
         self.app.config["file_transcription_model"] = model
         self.app.save_config()
         
+    def change_upload_codec(self, index):
+        codec = self.codec_combo.itemData(index)
+        self.app.upload_codec = codec
+        self.app.worker.upload_codec = codec
+        self.app.config["upload_codec"] = codec
+        self.app.save_config()
+        
     def change_mode(self, mode):
         self.app.active_prompt = mode
         self.app.save_config()
@@ -898,7 +3223,10 @@ class DarhisperInterface(QMainWindow):
 
 # --- Main Application Controller ---
 class DarhisperApp(QObject):
-    request_transcribe = pyqtSignal(object, str, str)
+    request_transcribe = pyqtSignal(object, str, str, float)  # audio, key, prompt, stop time
+    request_model = pyqtSignal(str)
+    request_prewarm = pyqtSignal()
+    request_idle_offload = pyqtSignal(str, float)
     start_recording_signal = pyqtSignal()
     stop_recording_signal = pyqtSignal()
 
@@ -927,7 +3255,59 @@ class DarhisperApp(QObject):
         self.gemini_key = self.config.get("gemini_api_key", "")
         self.active_prompt = self.config.get("active_prompt_key", "Transcripción Literal")
         self.file_transcription_model = self.config.get("file_transcription_model", "gemini-3-flash-preview")
+        self.upload_codec = self.config.get("upload_codec", DEFAULT_UPLOAD_CODEC)
+        if self.upload_codec not in UPLOAD_CODECS:
+            self.upload_codec = DEFAULT_UPLOAD_CODEC
+        self.live_model = self.config.get("live_model", DEFAULT_ASR_MODEL)
+        if self.live_model not in ASR_MODELS:
+            self.live_model = DEFAULT_ASR_MODEL
         self.hotkey = self.deserialize_hotkey(self.config.get("hotkey", ["Key.ctrl_r"]))
+        self.optimistic_paste = self.config.get("optimistic_paste", False)
+        # An explicit environment variable wins over the saved config
+        set_log_level(os.environ.get("DARHISPER_LOG_LEVEL") or self.config.get("log_level", "INFO"))
+        PROFILER.mode = os.environ.get("DARHISPER_PROFILE") or self.config.get("profiling", "off")
+        if PROFILER.mode not in PROFILE_MODES:
+            PROFILER.mode = "off"
+        PROFILER.interval = self.config.get("profile_interval_ms", 50) / 1000
+        self.worker.optimistic_paste = self.optimistic_paste
+        self.worker.latency_budget = self.config.get("latency_budget_s", LATENCY_BUDGET)
+        self.late_result_action = self.config.get("late_result_action", "offer")
+        self.local_prompts = set(self.config.get("local_prompts", [])) & set(LOCAL_PROMPT_PROCESSORS)
+        self.worker.local_prompts = set(self.local_prompts)
+        self.worker.chunk_caller.hedge = self.config.get("hedge_requests", False)
+        self.worker.chunk_planner.parallelism = self.config.get("file_parallelism", 4)
+        self.recorder.native_rate = self.config.get("capture_native_rate", True)
+        self.worker.rate_limiter.configure(
+            self.config.get("gemini_rpm", 60),
+            self.config.get("gemini_tpm", 1_000_000),
+            self.config.get("gemini_live_reserve", 0.25),
+        )
+        self.worker.model_name = self.live_model
+        self.worker.upload_codec = self.upload_codec
+        self.worker.decode_workers = self.config.get("decode_workers", self.worker.decode_workers)
+        self.worker.inline_max_bytes = int(self.config.get("inline_max_mb", INLINE_MAX_BYTES / 1024 / 1024) * 1024 * 1024)
+        self.worker.model_registry.vram_budget = self.config.get("asr_vram_budget_mb", 6000) * 1024 * 1024
+        self.worker.model_registry.ram_budget = self.config.get("asr_ram_budget_mb", 8000) * 1024 * 1024
+        asr_processes = self.config.get("asr_processes", 0)
+        if asr_processes > 0:
+            self.worker.asr_pool = ASRProcessPool(
+                size=asr_processes,
+                model_name=self.live_model,
+                vram_budget_mb=self.config.get("asr_vram_budget_mb", 6000),
+                ram_budget_mb=self.config.get("asr_ram_budget_mb", 8000),
+            )
+            self.worker.asr_pool.start()
+        self.worker.chunk_planner.max_payload_bytes = self.config.get("max_payload_mb", 20) * 1024 * 1024
+        
+        # Optimistic paste state: raw text currently on screen waiting for Gemini
+        self.stop_time = None
+        self.pending_raw = None
+        self.pending_raw_time = None
+        # Set when the caret may have left the pasted span (typing, clicks, a new dictation)
+        self.typed_since_paste = False
+        self.synthetic_input_until = 0.0
+        self.late_text = None
+        self.late_balloon = False  # the balloon on screen offers the late result
         
         # Set Gemini client on worker
         if self.gemini_key:
@@ -945,6 +3325,7 @@ class DarhisperApp(QObject):
         # Global Hotkey
         self.current_keys = set()
         self.key_listener = None
+        self.mouse_listener = None
         self.setup_hotkey()
         
         # Generate feedback sounds
@@ -953,13 +3334,37 @@ class DarhisperApp(QObject):
         
         # Signals
         self.request_transcribe.connect(self.worker.transcribe)
+        self.request_model.connect(self.worker.set_model)
+        self.request_prewarm.connect(self.worker.prewarm)
+        self.request_idle_offload.connect(self.worker.idle_offload)
         self.worker.finished.connect(self.handle_transcription_result)
+        self.worker.raw_ready.connect(self.handle_raw_result)
+        self.worker.refined.connect(self.handle_refined_result)
+        self.worker.late_result.connect(self.handle_late_result)
+        self.tray_icon.messageClicked.connect(self.on_message_clicked)
         self.worker.file_finished.connect(self.handle_file_transcription_result)
         self.worker.file_progress.connect(self.handle_file_progress)
+        self.worker.file_text_ready.connect(self.handle_file_text)
+        self.worker.file_cancelled.connect(self.handle_file_cancelled)
+        self.worker.file_failed.connect(self.handle_file_failed)
         self.worker.error.connect(self.handle_error)
         self.start_recording_signal.connect(self.start_recording)
         self.stop_recording_signal.connect(self.stop_recording)
         
+        self.qt_app.aboutToQuit.connect(METRICS.report)
+        self.qt_app.aboutToQuit.connect(self.worker.smart_cache.flush)
+        self.qt_app.aboutToQuit.connect(self.worker.history.close)
+        if self.worker.asr_pool is not None:
+            self.qt_app.aboutToQuit.connect(self.worker.asr_pool.stop)
+        
+        # Idle offload of the live model (0 disables it)
+        self.idle_offload_minutes = self.config.get("idle_offload_minutes", 15)
+        self.idle_offload_mode = self.config.get("idle_offload_mode", "cpu")
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self.check_idle)
+        if self.idle_offload_minutes:
+            self.idle_timer.start(60 * 1000)
+        
         # Preload Model
         QTimer.singleShot(1000, lambda: self.worker.load_model())
 
@@ -1033,6 +3438,31 @@ class DarhisperApp(QObject):
             action.triggered.connect(lambda checked, n=p_name: self.change_prompt(n))
             prompt_menu.addAction(action)
             
+        local_menu = menu.addMenu("Procesado local (sin red)")
+        for p_name in LOCAL_PROMPT_PROCESSORS:
+            action = QAction(p_name, self.qt_app)
+            action.setCheckable(True)
+            action.setChecked(p_name in self.local_prompts)
+            action.triggered.connect(lambda checked, n=p_name: self.toggle_local_prompt(n, checked))
+            local_menu.addAction(action)
+            
+        if self.late_text:
+            late_action = QAction("Copiar resultado tardío de Gemini", self.qt_app)
+            late_action.triggered.connect(self.copy_late_result)
+            menu.addAction(late_action)
+            
+        optimistic_action = QAction("Pegar texto crudo primero", self.qt_app)
+        optimistic_action.setCheckable(True)
+        optimistic_action.setChecked(self.optimistic_paste)
+        optimistic_action.triggered.connect(self.toggle_optimistic_paste)
+        menu.addAction(optimistic_action)
+        
+        profile_action = QAction("Perfilar dictados (diagnóstico)", self.qt_app)
+        profile_action.setCheckable(True)
+        profile_action.setChecked(PROFILER.mode != "off")
+        profile_action.triggered.connect(self.toggle_profiling)
+        menu.addAction(profile_action)
+            
         menu.addSeparator()
         
         # API Key
@@ -1050,6 +3480,8 @@ class DarhisperApp(QObject):
     def open_interface(self):
         if self.interface is None:
             self.interface = DarhisperInterface(self)
+        else:
+            self.interface.refresh_history()
         self.interface.show()
         self.interface.activateWindow()
 
@@ -1058,6 +3490,28 @@ class DarhisperApp(QObject):
         self.save_config()
         self.create_menu()
 
+    def toggle_local_prompt(self, name, checked):
+        if checked:
+            self.local_prompts.add(name)
+        else:
+            self.local_prompts.discard(name)
+        self.worker.local_prompts = set(self.local_prompts)
+        self.config["local_prompts"] = sorted(self.local_prompts)
+        self.save_config()
+
+    def toggle_optimistic_paste(self, checked):
+        self.optimistic_paste = checked
+        self.worker.optimistic_paste = checked
+        self.config["optimistic_paste"] = checked
+        self.save_config()
+
+    def toggle_profiling(self, checked):
+        PROFILER.mode = "sample" if checked else "off"
+        self.config["profiling"] = PROFILER.mode
+        self.save_config()
+        if checked:
+            logging.info("Profiling enabled, profiles go to %s", PROFILER.directory)
+
     def ask_api_key(self):
         text, ok = QInputDialog.getText(None, "Gemini API Key", "Introduce tu API Key:", text=self.gemini_key)
         if ok:
@@ -1089,14 +3543,24 @@ class DarhisperApp(QObject):
             on_release=self.on_release
         )
         self.key_listener.start()
+        # A click can move the caret away from the optimistic paste
+        self.mouse_listener = mouse.Listener(on_click=self.on_click)
+        self.mouse_listener.start()
 
     def on_press(self, key):
         if key in self.hotkey:
             self.current_keys.add(key)
+        elif self.pending_raw is not None and time.monotonic() > self.synthetic_input_until:
+            # The user typed after the optimistic paste; the span is no longer ours
+            self.typed_since_paste = True
         
         if self.current_keys == self.hotkey and not self.recorder.recording:
             self.start_recording_signal.emit()
 
+    def on_click(self, x, y, button, pressed):
+        if pressed and self.pending_raw is not None:
+            self.typed_since_paste = True
+
     def on_release(self, key):
         if key in self.current_keys:
             self.current_keys.remove(key)
@@ -1105,10 +3569,18 @@ class DarhisperApp(QObject):
             if not self.hotkey.issubset(self.current_keys):
                 self.stop_recording_signal.emit()
 
+    def check_idle(self):
+        if not self.recorder.recording:
+            self.request_idle_offload.emit(self.idle_offload_mode, self.idle_offload_minutes * 60.0)
+
     def start_recording(self):
         if self.recorder.recording:
             return
+        if self.pending_raw is not None:
+            # The hotkey is held or the user is dictating elsewhere: never swap
+            self.typed_since_paste = True
         logging.info("Starting Recording")
+        self.request_prewarm.emit()
         if self.start_sound is not None:
             try:
                 sd.play(self.start_sound, samplerate=SAMPLE_RATE)
@@ -1127,18 +3599,105 @@ class DarhisperApp(QObject):
             except:
                 pass
         self.overlay.stop_recording()
+        self.stop_time = time.monotonic()
         audio = self.recorder.stop()
         if audio is not None:
-            self.request_transcribe.emit(audio, self.gemini_key, self.active_prompt)
+            self.request_transcribe.emit(audio, self.gemini_key, self.active_prompt, self.stop_time)
 
     def handle_transcription_result(self, text):
         if not text:
             return
         
-        logging.info(f"Pasting: {text}")
+        logging.debug("Pasting: %s", text)
+        self.record_perceived_latency("blocking")
+        self.paste_text(text)
+
+    def handle_raw_result(self, text):
+        """Optimistic mode: paste the Parakeet text while Gemini is working."""
+        logging.debug("Pasting raw (optimistic): %s", text)
+        self.record_perceived_latency("optimistic")
+        self.pending_raw = text
+        self.pending_raw_time = time.monotonic()
+        self.typed_since_paste = False
+        self.paste_text(text)
+
+    def handle_refined_result(self, raw_text, text):
+        """Optimistic mode: swap the pasted raw text for the Gemini result."""
+        if self.pending_raw != raw_text:
+            return
+        elapsed = time.monotonic() - self.pending_raw_time
+        self.pending_raw = None
+        
+        if not text or text == raw_text:
+            METRICS.incr("optimistic.unchanged")
+            return
+        if elapsed > OPTIMISTIC_DEADLINE:
+            logging.info("Gemini result after %.1fs, keeping raw text", elapsed)
+            METRICS.incr("optimistic.deadline_missed")
+            return
+        if not self.can_swap_paste():
+            logging.info("Caret may have moved after paste, Gemini result left in clipboard")
+            METRICS.incr("optimistic.clipboard_only")
+            QApplication.clipboard().setText(text)
+            self.show_message("Resultado de Gemini copiado al portapapeles")
+            return
+        
+        METRICS.incr("optimistic.replaced")
+        # Wait until the raw paste has landed before selecting it
+        delay = max(0, int((0.15 - elapsed) * 1000))
+        QTimer.singleShot(delay, lambda: self.replace_pasted_text(raw_text, text))
+
+    def handle_late_result(self, raw_text, text):
+        """Gemini answered after the latency budget; the raw text is already pasted."""
+        if self.late_result_action == "discard":
+            return
+        self.late_text = text
+        self.create_menu()
+        self.show_message("El resultado de Gemini llegó tarde. Haz clic para copiarlo.", late=True)
+
+    def show_message(self, message, late=False):
+        # messageClicked carries no message id, so remember which balloon is up
+        self.late_balloon = late
+        self.tray_icon.showMessage("Darhisper", message)
+
+    def on_message_clicked(self):
+        if self.late_balloon:
+            self.late_balloon = False
+            self.copy_late_result()
+
+    def copy_late_result(self):
+        if self.late_text:
+            QApplication.clipboard().setText(self.late_text)
+            self.late_text = None
+            self.create_menu()
+
+    def can_swap_paste(self):
+        # Held keys would turn Shift+Left into word or workspace moves
+        return not self.typed_since_paste and not self.current_keys
+
+    def replace_pasted_text(self, raw_text, text):
+        if not self.can_swap_paste():
+            QApplication.clipboard().setText(text)
+            return
+        try:
+            self.synthetic_input_until = time.monotonic() + 1.0
+            QApplication.clipboard().setText(text)
+            with pyautogui.hold('shift'):
+                pyautogui.press('left', presses=len(raw_text), interval=0)
+            pyautogui.hotkey('ctrl', 'v')
+        except Exception as e:
+            logging.error("Replace error: %s", e)
+
+    def record_perceived_latency(self, mode):
+        if self.stop_time is not None:
+            METRICS.record(f"perceived_latency.{mode}", time.monotonic() - self.stop_time)
+            self.stop_time = None
+
+    def paste_text(self, text):
         try:
             clipboard = QApplication.clipboard()
             clipboard.setText(text)
+            self.synthetic_input_until = time.monotonic() + 0.5
             QTimer.singleShot(100, lambda: pyautogui.hotkey('ctrl', 'v'))
         except Exception as e:
             logging.error(f"Paste error: {e}")
@@ -1147,6 +3706,19 @@ class DarhisperApp(QObject):
         if self.interface:
             self.interface.on_transcription_complete(text)
 
+    def handle_file_text(self, text):
+        if self.interface:
+            self.interface.append_transcript(text)
+
+    def handle_file_cancelled(self):
+        if self.interface:
+            self.interface.on_transcription_cancelled()
+
+    def handle_file_failed(self, error):
+        if self.interface:
+            self.interface.on_transcription_failed()
+        self.handle_error(error)
+
     def handle_file_progress(self, current, total):
         if self.interface:
             self.interface.update_progress(current, total)
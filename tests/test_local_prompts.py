@@ -0,0 +1,37 @@
+"""Local Smart Prompt fast path on ordinary dictation."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+main = pytest.importorskip("main")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("comprar 1.5 kilos de pan. llamar a las 3.30",
+     "- Comprar 1.5 kilos de pan\n- Llamar a las 3.30"),
+    ("comprar pan, y después llamar a Juan", "- Comprar pan\n- Llamar a Juan"),
+    ("hasta luego Lucas", "- Hasta luego Lucas"),
+    ("enviar la factura a Marta; después reservar la sala",
+     "- Enviar la factura a Marta\n- Reservar la sala"),
+])
+def test_todo_list(text, expected):
+    assert main.local_todo_list(text) == expected
+
+
+def test_todo_list_has_no_dangling_connective_items():
+    items = main.local_todo_list("comprar pan y después").splitlines()
+    assert items == ["- Comprar pan y después"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("pon 10 10 unidades", "Pon 10 10 unidades"),
+    ("no no no, eso no", "No no no, eso no"),
+    ("¿Eh? ¿qué dices?", "¿Qué dices?"),
+    ("que que mañana vamos", "Que mañana vamos"),
+    ("eh, bueno, quería decir que mañana vamos al cine a las ocho .",
+     "Quería decir que mañana vamos al cine a las ocho."),
+])
+def test_cleanup(text, expected):
+    assert main.local_cleanup(text) == expected